@@ -0,0 +1,361 @@
+"""
+SQLite store of running per-channel and per-channel-month aggregates.
+Scraped records are folded in as they come: every video's last
+contribution is kept, so a re-scraped video first takes its old counts
+out of the sums and then adds the new ones, and the min/max ranges of
+the channel and month it left are recomputed. The statistics of
+explore.py can then be read from the sums instead of recomputed from
+every raw scrape.
+
+Usage (folding in the records of earlier scrapes):
+    python aggregate_store.py data/aggregates.db data/scrapes/*.jsonl
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+import pandas as pd
+import writers
+
+
+# Summed columns of both aggregate tables, as named by
+# explore.channel_partials
+SUMS = (
+    'videos', 'views', 'duration', 'viewtime',
+    'likes', 'likes_count', 'dislikes', 'dislikes_count',
+    'reactions', 'reactions_count'
+)
+
+# Range columns of both aggregate tables: (min or max, contributions
+# column they are taken from)
+RANGES = {
+    'first_upload': ('min', 'upload_date'),
+    'last_upload': ('max', 'upload_date'),
+    'min_views': ('min', 'views'),
+    'max_views': ('max', 'views'),
+    'min_duration': ('min', 'duration'),
+    'max_duration': ('max', 'duration'),
+    'min_likes': ('min', 'likes'),
+    'max_likes': ('max', 'likes'),
+    'min_dislikes': ('min', 'dislikes'),
+    'max_dislikes': ('max', 'dislikes')
+}
+
+# Range columns added after the first version of the schema
+ADDED_COLUMNS = [name for name in RANGES if name.startswith(('min_', 'max_'))]
+
+AGGREGATE_COLUMNS = ', '.join(
+    [f'{name} INTEGER NOT NULL DEFAULT 0' for name in SUMS]
+    + [f'{name} {"TEXT" if source == "upload_date" else "INTEGER"}'
+       for name, (_, source) in RANGES.items()])
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS contributions (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    upload_date TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    views INTEGER NOT NULL,
+    likes INTEGER,
+    dislikes INTEGER,
+    scrape_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contributions_channel_month
+    ON contributions (channel_id, month);
+CREATE TABLE IF NOT EXISTS channel_totals (
+    channel_id TEXT PRIMARY KEY,
+    {AGGREGATE_COLUMNS}
+);
+CREATE TABLE IF NOT EXISTS channel_months (
+    channel_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    {AGGREGATE_COLUMNS},
+    PRIMARY KEY (channel_id, month)
+);
+"""
+
+# Add a batch of deltas to the sums and widen the ranges. Ranges can't
+# be narrowed by a delta, so keys that lost a contribution have theirs
+# recomputed from the contributions afterwards.
+UPSERT = """
+INSERT INTO {table} ({keys}, {columns})
+VALUES ({placeholders})
+ON CONFLICT ({keys}) DO UPDATE SET {updates}
+"""
+
+
+# DEFINE HELPER FUNCTIONS
+# ============================ #
+
+def to_count(value) -> int:
+    """A scraped count as an int (older scrapes have strings), or None."""
+    if value is None or value == '':
+        return None
+
+    return int(float(value))
+
+
+def normalize(record: Dict) -> Dict:
+    """
+    The fields of a scraped record the aggregates are made of, in the
+    units explore.basic_wrangling leaves them in (whole minutes).
+    """
+    return {
+        # Old scrapes have no video IDs, their videos are told apart
+        # by channel, upload date and title instead
+        'video_id': record.get('video_id') or '{}/{}/{}'.format(
+            record['channel_id'], record['upload_date'], record['title']),
+        'channel_id': record['channel_id'],
+        'month': record['upload_date'][:7],
+        'upload_date': record['upload_date'][:10],
+        'duration': int(round(record['duration'] / 60, 2)),
+        'views': int(record['views']),
+        'likes': to_count(record.get('likes')),
+        'dislikes': to_count(record.get('dislikes')),
+        'scrape_date': record.get('scrape_date') or ''
+    }
+
+
+def contribution(row: Dict) -> Dict:
+    """What one video adds to the sums of its channel and month."""
+    likes, dislikes = row['likes'], row['dislikes']
+    both = likes is not None and dislikes is not None
+
+    return {
+        'videos': 1,
+        'views': row['views'],
+        'duration': row['duration'],
+        'viewtime': row['views'] * row['duration'],
+        'likes': likes or 0,
+        'likes_count': int(likes is not None),
+        'dislikes': dislikes or 0,
+        'dislikes_count': int(dislikes is not None),
+        'reactions': likes + dislikes if both else 0,
+        'reactions_count': int(both)
+    }
+
+
+def accumulate(
+    deltas: Dict,
+    key: tuple,
+    amounts: Dict,
+    sign: int,
+    row: Dict = None
+) -> None:
+    """
+    Add signed amounts to the deltas of a key, and widen its ranges
+    with the values of an added row.
+    """
+    delta = deltas.setdefault(key, dict(
+        {name: 0 for name in SUMS}, **{name: None for name in RANGES}))
+    for name in SUMS:
+        delta[name] += sign * amounts[name]
+    if row is None:
+        return
+    for name, (function, source) in RANGES.items():
+        if row[source] is None:
+            continue
+        pick = min if function == 'min' else max
+        delta[name] = row[source] if delta[name] is None \
+            else pick(delta[name], row[source])
+
+
+class AggregateStore:
+    """Per-channel and per-channel-month sums of the scraped videos."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self._add_columns()
+
+    def _add_columns(self) -> None:
+        """
+        Bring a store made with an older schema up to date, filling in
+        the added range columns from the contributions.
+        """
+        with self.connection:
+            for table, keys in (('channel_totals', ('channel_id',)),
+                                ('channel_months', ('channel_id', 'month'))):
+                columns = {
+                    row[1] for row in
+                    self.connection.execute(f'PRAGMA table_info({table})')}
+                missing = [name for name in ADDED_COLUMNS
+                           if name not in columns]
+                for name in missing:
+                    self.connection.execute(
+                        f'ALTER TABLE {table} ADD COLUMN {name} INTEGER')
+                if missing:
+                    self._recompute_ranges(table, keys, {
+                        tuple(row) for row in self.connection.execute(
+                            f"SELECT {', '.join(keys)} FROM {table}")})
+
+    def add_records(self, records: Iterable[Dict]) -> int:
+        """
+        Fold scraped records into the aggregates in one transaction.
+        A video seen before replaces its earlier contribution, unless
+        the record is from an older scrape. Returns how many were used.
+        """
+        totals, months = {}, {}
+        # Keys that lost a contribution, whose ranges must be recomputed
+        retracted_totals, retracted_months = set(), set()
+        used = 0
+        with self.lock, self.connection:
+            for record in records:
+                if not record.get('upload_date') or \
+                        record.get('views') is None:
+                    continue
+                row = normalize(record)
+                old = self.connection.execute(
+                    'SELECT * FROM contributions WHERE video_id = ?',
+                    (row['video_id'],)).fetchone()
+                if old is not None:
+                    if old['scrape_date'] > row['scrape_date']:
+                        continue
+                    old = dict(old)
+                    amounts = contribution(old)
+                    accumulate(totals, (old['channel_id'],), amounts, -1)
+                    accumulate(
+                        months, (old['channel_id'], old['month']),
+                        amounts, -1)
+                    retracted_totals.add((old['channel_id'],))
+                    retracted_months.add((old['channel_id'], old['month']))
+
+                amounts = contribution(row)
+                accumulate(totals, (row['channel_id'],), amounts, 1, row)
+                accumulate(
+                    months, (row['channel_id'], row['month']), amounts, 1,
+                    row)
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO contributions VALUES '
+                    '(:video_id, :channel_id, :month, :upload_date, '
+                    ':duration, :views, :likes, :dislikes, :scrape_date)',
+                    row)
+                used += 1
+
+            self._apply('channel_totals', ('channel_id',), totals)
+            self._apply('channel_months', ('channel_id', 'month'), months)
+            self._recompute_ranges(
+                'channel_totals', ('channel_id',), retracted_totals)
+            self._recompute_ranges(
+                'channel_months', ('channel_id', 'month'), retracted_months)
+            # A month all of whose videos moved to other months is gone
+            self.connection.execute(
+                'DELETE FROM channel_months WHERE videos = 0')
+            self.connection.execute(
+                'DELETE FROM channel_totals WHERE videos = 0')
+
+        return used
+
+    def _apply(self, table: str, keys: tuple, deltas: Dict) -> None:
+        columns = SUMS + tuple(RANGES)
+        updates = [f'{name} = {name} + excluded.{name}' for name in SUMS]
+        updates += [
+            f'{name} = coalesce({function}({name}, excluded.{name}), '
+            f'{name}, excluded.{name})'
+            for name, (function, _) in RANGES.items()]
+        self.connection.executemany(
+            UPSERT.format(
+                table=table,
+                keys=', '.join(keys),
+                columns=', '.join(columns),
+                placeholders=', '.join('?' * (len(keys) + len(columns))),
+                updates=',\n    '.join(updates)),
+            [
+                key + tuple(delta[name] for name in columns)
+                for key, delta in deltas.items()
+            ])
+
+    def _recompute_ranges(self, table: str, keys: tuple, stale: set) -> None:
+        """Set the ranges of the given keys from their contributions."""
+        ranges = ', '.join(
+            f'{function}({source})' for function, source in RANGES.values())
+        where = ' AND '.join(f'{key} = ?' for key in keys)
+        for key in stale:
+            values = self.connection.execute(
+                f'SELECT {ranges} FROM contributions WHERE {where}',
+                key).fetchone()
+            self.connection.execute(
+                f"UPDATE {table} SET "
+                f"{', '.join(f'{name} = ?' for name in RANGES)} "
+                f"WHERE {where}",
+                tuple(values) + key)
+
+    def _frame(self, sql: str, params=()) -> pd.DataFrame:
+        with self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        frame = pd.DataFrame(
+            [dict(row) for row in rows],
+            columns=rows[0].keys() if rows else None)
+        for column in ('first_upload', 'last_upload'):
+            if column in frame:
+                frame[column] = pd.to_datetime(frame[column])
+
+        return frame
+
+    def partials(self, channel_ids: List[str] = None) -> pd.DataFrame:
+        """
+        Channel totals in the format of explore.channel_partials (plus
+        the min/max columns of RANGES), so explore.finalize_statistics
+        turns them into statistics.
+        """
+        query = 'SELECT * FROM channel_totals'
+        params = ()
+        if channel_ids:
+            marks = ', '.join('?' * len(channel_ids))
+            query += f' WHERE channel_id IN ({marks})'
+            params = tuple(channel_ids)
+        frame = self._frame(query + ' ORDER BY channel_id', params)
+
+        return frame.set_index('channel_id') if len(frame) else frame
+
+    def monthly(self, channel_id: str = None) -> pd.DataFrame:
+        """Sums per channel and upload month, oldest month first."""
+        query = 'SELECT * FROM channel_months'
+        params = ()
+        if channel_id is not None:
+            query += ' WHERE channel_id = ?'
+            params = (channel_id,)
+
+        return self._frame(query + ' ORDER BY channel_id, month', params)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_records(path: str) -> Iterable[Dict]:
+    """Records of a scrape saved as JSON Lines or as a JSON array."""
+    if path.endswith('.jsonl'):
+        return writers.read_jsonl(path)
+
+    with open(path) as f:
+        return json.load(f)
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('store', help='path of the SQLite aggregate store')
+    parser.add_argument('scrapes', nargs='+', help='.json or .jsonl scrapes')
+    args = parser.parse_args()
+
+    with AggregateStore(args.store) as store:
+        for path in args.scrapes:
+            used = store.add_records(read_records(path))
+            print(f"{path}: {used:,} records folded in")
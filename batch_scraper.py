@@ -0,0 +1,186 @@
+"""
+Scrape the videos of many channels in one run.
+The job spec (config/batch_config.json) lists the channels, each with
+either a links list or a channel ID to take from the link store. A
+video listed by several channels is only scraped once, for the first
+channel listing it. The channels' videos are interleaved round-robin
+into one shared fetch/parse pipeline, so a big channel can't starve
+the small ones, and each channel gets its own output file (JSON
+Lines, or Parquet with OUTPUT_FORMAT parquet).
+"""
+import collections
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List
+import http_client
+import link_store
+import metrics
+import page_archive
+import video_scraper
+import writers
+
+
+# DEFINE HELPER FUNCTIONS
+# ============================ #
+
+def job_links(job: Dict, store: link_store.LinkStore = None) -> List[str]:
+    """The links of one job: its list file, or its channel's pending links."""
+    if job.get("INPUT_PATH"):
+        return video_scraper.read_links(job["INPUT_PATH"])
+    if store is None:
+        raise ValueError(
+            f"Job {job['NAME']} needs an INPUT_PATH or a LINK_STORE_PATH")
+
+    return store.pending(job["CHANNEL_ID"], job.get("STALE_AFTER_DAYS"))
+
+
+def deduplicate(jobs: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """
+    Drop videos already listed by an earlier job (or earlier in the
+    same job), keeping the jobs' order.
+    """
+    seen = set()
+    unique = {}
+    for name, links in jobs.items():
+        unique[name] = []
+        for url in links:
+            video_id = video_scraper.video_id_from_url(url)
+            if video_id is None or video_id in seen:
+                continue
+            seen.add(video_id)
+            unique[name].append(url)
+
+    return unique
+
+
+def round_robin(jobs: Dict[str, List[str]]) -> Iterator[str]:
+    """Take one link from each job in turn until all of them are empty."""
+    queues = collections.deque(
+        collections.deque(links) for links in jobs.values() if links)
+    while queues:
+        links = queues.popleft()
+        yield links.popleft()
+        if links:
+            queues.append(links)
+
+
+def scrape_jobs(
+    jobs: Dict[str, List[str]],
+    options: Dict,
+    writers_by_job: Dict,
+    store: link_store.LinkStore = None
+) -> None:
+    """Scrape the jobs' links fairly, writing each record to its job's file."""
+    owner = {
+        video_scraper.video_id_from_url(url): name
+        for name, links in jobs.items() for url in links
+    }
+
+    def write_record(record: Dict) -> None:
+        writers_by_job[owner[record['video_id']]].write(record)
+
+    urls = list(round_robin(jobs))
+    archive = page_archive.from_options(options)
+    try:
+        with video_scraper.record_hooks(options, write_record, store) as (
+                on_record, on_failure):
+            if options['CONCURRENCY'] > 1:
+                video_scraper.scrape_list_concurrent(
+                    urls, options, on_record, on_failure, archive)
+            else:
+                video_scraper.scrape_list_sequential(
+                    urls, options, on_record, on_failure, archive)
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    runtime_start = time.time()
+    current_date = datetime.today().strftime('%Y-%m-%d')
+
+    # Unpack the job spec
+    # -------------------------------------- #
+    config_path = "config/batch_config.json"
+    if len(sys.argv) > 1:
+        config_path = sys.argv[1]
+    job_spec = video_scraper.load_configuration_file(config_path)
+    if job_spec is False:
+        print("\nMissing, empty or wrongly named job spec. \
+            Program will terminate.")
+        sys.exit()
+
+    video_options = video_scraper.load_configuration_file(
+        job_spec["VIDEO_CONFIG"])
+    if video_options is False:
+        print("\nMissing scraper config file. Program will terminate.")
+        sys.exit()
+    video_options = dict(video_scraper.PIPELINE_DEFAULTS, **video_options)
+    video_options["SCRAPE_DATE"] = current_date
+    http_client.configure(video_options)
+    output_dir = job_spec.get("OUTPUT_DIR", "data/scrapes")
+    os.makedirs(output_dir, exist_ok=True)
+    # Parquet files can't be appended to, so only JSON Lines resume
+    parquet = video_options.get("OUTPUT_FORMAT") == "parquet"
+    extension = "parquet" if parquet else "jsonl"
+    resume = not parquet and video_options.get("RESUME", False)
+
+    store = None
+    if video_options.get("LINK_STORE_PATH"):
+        store = link_store.LinkStore(video_options["LINK_STORE_PATH"])
+
+    # Gather the jobs' links, once per video
+    # -------------------------------------- #
+    jobs, output_paths = {}, {}
+    for job in job_spec["JOBS"]:
+        name = job["NAME"]
+        output_paths[name] = os.path.join(output_dir, f"{name}.{extension}")
+        jobs[name] = job_links(job, store)
+    listed = sum(len(links) for links in jobs.values())
+    jobs = deduplicate(jobs)
+    print(f"\n{listed:,} links in {len(jobs)} jobs, "
+          f"{sum(len(links) for links in jobs.values()):,} unique videos.")
+
+    if resume:
+        for name, links in jobs.items():
+            done = writers.done_video_ids(output_paths[name])
+            jobs[name] = [
+                url for url in links
+                if video_scraper.video_id_from_url(url) not in done
+            ]
+    for name, links in jobs.items():
+        print(f"\t* {name}: {len(links):,} videos to scrape")
+
+    # Scrape every job through one pipeline
+    # -------------------------------------- #
+    if parquet:
+        writers_by_job = {
+            name: writers.ParquetWriter(path)
+            for name, path in output_paths.items()
+        }
+    else:
+        writers_by_job = {
+            name: writers.JsonlWriter(
+                path,
+                append=resume,
+                flush_every=video_options.get("FLUSH_EVERY", 10))
+            for name, path in output_paths.items()
+        }
+    exporter = metrics.from_options(video_options)
+    try:
+        scrape_jobs(jobs, video_options, writers_by_job, store)
+    finally:
+        exporter.close()
+        for writer in writers_by_job.values():
+            writer.close()
+        if store is not None:
+            store.close()
+
+    # Keeping track of runtime.
+    # -------------------------------------- #
+    runtime_end = time.time()
+    print(f"\nScript done in {round(runtime_end-runtime_start,2):,}s")
@@ -0,0 +1 @@
+"""Offline benchmarks for the scrapers and the analysis code."""
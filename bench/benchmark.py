@@ -0,0 +1,305 @@
+"""
+End-to-end throughput benchmark for the scrapers, run against the
+local replay server so results are reproducible without a network.
+
+Usage:
+    python -m bench.benchmark --corpus bench/corpus --videos 500 \
+        --concurrency 16 --parse-workers 4 --latency-ms 80
+    python -m bench.benchmark --synthetic 200 --channel --enumerate
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+import http_client
+from bench import fixtures
+
+
+# DEFINE HELPER FUNCTIONS
+# ============================ #
+
+class TimedHttpClient(http_client.HttpClient):
+    """HTTP client that records the latency and size of every response."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self.bytes_downloaded = 0
+        self.lock = threading.Lock()
+
+    def timed(self, request, *args) -> bytes:
+        start = time.perf_counter()
+        try:
+            body = request(*args)
+        finally:
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.latencies.append(latency)
+        with self.lock:
+            self.bytes_downloaded += len(body)
+
+        return body
+
+    def get(self, url: str) -> bytes:
+        return self.timed(super().get, url)
+
+    def post(self, url: str, body: bytes, content_type: str) -> bytes:
+        # Covers post_json, i.e. the channel enumerator's continuations
+        return self.timed(super().post, url, body, content_type)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of the values."""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+
+    return ordered[index]
+
+
+def free_port() -> int:
+    """Ask the OS for a port nobody is listening on."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_replay_server(args: argparse.Namespace) -> tuple:
+    """Run the replay server in its own process and wait until it's up."""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, '-m', 'bench.replay_server', 'serve',
+        '--corpus', args.corpus,
+        '--port', str(port),
+        '--latency-ms', str(args.latency_ms),
+        '--jitter-ms', str(args.jitter_ms),
+        '--error-rate', str(args.error_rate)
+    ], stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Replay server didn't start")
+
+
+def corpus_video_ids(corpus_dir: str) -> List[str]:
+    """List the IDs of the watch pages in a corpus."""
+    return sorted(
+        name[:-len('.html')]
+        for name in os.listdir(os.path.join(corpus_dir, 'watch'))
+        if name.endswith('.html'))
+
+
+def resource_usage() -> Dict:
+    """CPU seconds and peak RSS (MB) of this process and its children."""
+    usage = {}
+    for who, name in ((resource.RUSAGE_SELF, 'self'),
+                      (resource.RUSAGE_CHILDREN, 'children')):
+        r = resource.getrusage(who)
+        usage[name + '_cpu'] = r.ru_utime + r.ru_stime
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        usage[name + '_rss'] = r.ru_maxrss / scale
+
+    return usage
+
+
+def summarize(
+    name: str,
+    pages: int,
+    elapsed: float,
+    latencies: List[float],
+    before: Dict,
+    after: Dict,
+    bytes_downloaded: int = 0
+) -> Dict:
+    """Collect the results of a benchmark run."""
+    return {
+        'benchmark': name,
+        'pages': pages,
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'cpu_seconds': round(
+            after['self_cpu'] - before['self_cpu']
+            + after['children_cpu'] - before['children_cpu'], 2),
+        'peak_rss_mb': round(max(after['self_rss'], after['children_rss']), 1),
+        'mb_downloaded': round(bytes_downloaded / 1024 / 1024, 1)
+    }
+
+
+# BENCHMARKS
+# ============================ #
+
+def bench_video_scraper(args: argparse.Namespace, base_url: str) -> Dict:
+    """Run video_scraper.scrape_list over the replayed watch pages."""
+    import video_scraper
+
+    video_ids = corpus_video_ids(args.corpus)
+    video_ids = (video_ids * (args.videos // len(video_ids) + 1))[:args.videos]
+    links = tempfile.NamedTemporaryFile('w', suffix='.list', delete=False)
+    with links:
+        for i, video_id in enumerate(video_ids):
+            # Unique IDs so resume/dedup logic never skips a repeat
+            links.write(f'{base_url}/watch?v={video_id}&n={i}\n')
+
+    client = TimedHttpClient(pool_maxsize=max(args.concurrency, 10))
+    http_client.set_client(client)
+    options = {
+        'CONCURRENCY': args.concurrency,
+        'MIN_CONCURRENCY': args.concurrency,
+        'PARSE_WORKERS': args.parse_workers,
+        'PARSER': args.parser,
+        'RATE_PER_SECOND': 1e9,
+        'BURST': 1e9,
+        'JITTER': 0,
+        'TARGET_LATENCY': 1e9,
+        'THROTTLE_PAUSE': 0.1,
+        'RETRY_BASE_DELAY': 0.1
+    }
+
+    before = resource_usage()
+    start = time.perf_counter()
+    records = video_scraper.scrape_list(links.name, options)
+    elapsed = time.perf_counter() - start
+    after = resource_usage()
+    os.remove(links.name)
+
+    return summarize(
+        'video_scraper', len(records), elapsed, client.latencies,
+        before, after, client.bytes_downloaded)
+
+
+def corpus_channel_ids(corpus_dir: str) -> List[str]:
+    """List the IDs of the channel pages in a corpus."""
+    return sorted(
+        name[:-len('.html')]
+        for name in os.listdir(os.path.join(corpus_dir, 'channel'))
+        if name.endswith('.html'))
+
+
+def bench_channel_enumerator(args: argparse.Namespace, base_url: str) -> Dict:
+    """Run the HTTP channel enumerator over the replayed channel pages."""
+    import channel_enumerator
+
+    client = TimedHttpClient()
+    channels = corpus_channel_ids(args.corpus)
+    links = 0
+    before = resource_usage()
+    start = time.perf_counter()
+    for channel_id in channels:
+        links += sum(1 for _ in channel_enumerator.enumerate_channel(
+            f'{base_url}/channel/{channel_id}/videos', client=client))
+    elapsed = time.perf_counter() - start
+    after = resource_usage()
+
+    # Latencies of every request: channel pages and continuation POSTs
+    result = summarize(
+        'channel_enumerator', len(channels), elapsed, client.latencies,
+        before, after, client.bytes_downloaded)
+    result['requests'] = len(client.latencies)
+    result['links'] = links
+
+    return result
+
+
+def bench_channel_harvester(args: argparse.Namespace, base_url: str) -> Dict:
+    """Run the Selenium channel harvester over a replayed channel page."""
+    import browser_pool
+    import channel_scraper
+    import rate_limiter
+
+    channels = corpus_channel_ids(args.corpus)
+    driver = browser_pool.make_chrome()
+    limiter = rate_limiter.from_options({
+        'RATE_PER_SECOND': args.scroll_rate, 'BURST': 1, 'JITTER': 0})
+
+    latencies, links = [], 0
+    before = resource_usage()
+    start = time.perf_counter()
+    try:
+        for channel_id in channels:
+            t = time.perf_counter()
+            links += len(channel_scraper.harvest_channel_links(
+                driver, f'{base_url}/channel/{channel_id}/videos', limiter))
+            latencies.append(time.perf_counter() - t)
+    finally:
+        driver.quit()
+    elapsed = time.perf_counter() - start
+    after = resource_usage()
+
+    result = summarize(
+        'channel_harvester', len(channels), elapsed, latencies, before, after)
+    result['links'] = links
+
+    return result
+
+
+def print_results(results: List[Dict]) -> None:
+    """Print the results as a small table."""
+    columns = list(results[0].keys())
+    for result in results[1:]:
+        columns += [key for key in result if key not in columns]
+    print()
+    for column in columns:
+        values = [str(result.get(column, '')) for result in results]
+        print(f"{column:>18}: " + ''.join(f"{v:>20}" for v in values))
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--corpus', default='bench/corpus')
+    parser.add_argument(
+        '--synthetic', type=int, default=0,
+        help='generate a synthetic corpus of this many pages first')
+    parser.add_argument('--videos', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--parser', default='fast')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument(
+        '--channel', action='store_true',
+        help='also benchmark the channel harvester (needs chromedriver)')
+    parser.add_argument(
+        '--enumerate', action='store_true',
+        help='also benchmark the HTTP channel enumerator')
+    parser.add_argument('--scroll-rate', type=float, default=10)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        fixtures.generate_corpus(args.corpus, args.synthetic)
+
+    process, base_url = start_replay_server(args)
+    try:
+        results = [bench_video_scraper(args, base_url)]
+        if args.enumerate:
+            results.append(bench_channel_enumerator(args, base_url))
+        if args.channel:
+            results.append(bench_channel_harvester(args, base_url))
+    finally:
+        process.terminate()
+        process.wait()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
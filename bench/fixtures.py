@@ -0,0 +1,259 @@
+"""
+Synthetic pages for benchmarking without a network.
+The watch pages carry the same `#watch7-content` metadata block and
+embedded ytInitialData/ytInitialPlayerResponse objects the scrapers
+read, padded with filler markup and scripts to a realistic size.
+"""
+import json
+import os
+import random
+import string
+from typing import Dict, List
+
+
+# Rough size of a real watch page
+DEFAULT_PAGE_SIZE = 400_000
+
+# Videos per page of a channel's video grid
+CHANNEL_BATCH = 30
+
+
+def make_video_id(rng: random.Random) -> str:
+    """Draw a random 11 character video ID."""
+    alphabet = string.ascii_letters + string.digits + '-_'
+
+    return ''.join(rng.choice(alphabet) for _ in range(11))
+
+
+def make_video(video_id: str, channel_id: str, rng: random.Random) -> Dict:
+    """Draw the statistics of a made-up video."""
+    views = rng.randint(1_000, 500_000)
+
+    return {
+        'video_id': video_id,
+        'channel_id': channel_id,
+        'title': f'Synthetic video {video_id} | Hearthstone',
+        'upload_date': (
+            f'20{rng.randint(14, 21)}-{rng.randint(1, 12):02d}'
+            f'-{rng.randint(1, 28):02d}'),
+        'duration': rng.randint(60, 3600),
+        'views': views,
+        'likes': views // rng.randint(20, 60),
+        'dislikes': views // rng.randint(500, 3000),
+        'keywords': ['hearthstone', 'synthetic'],
+        'chapters': [
+            {'title': 'Intro', 'start': 0},
+            {'title': 'Game 1', 'start': rng.randint(30, 300)}
+        ]
+    }
+
+
+def _toggle_button(icon: str, count: int) -> Dict:
+    label = f'{count:,} {icon.lower()}s'
+
+    return {
+        'toggleButtonRenderer': {
+            'defaultIcon': {'iconType': icon},
+            'defaultText': {
+                'accessibility': {'accessibilityData': {'label': label}},
+                'simpleText': str(count)
+            }
+        }
+    }
+
+
+def make_watch_page(video: Dict, page_size: int = DEFAULT_PAGE_SIZE) -> bytes:
+    """Render a watch page for the video."""
+    minutes, seconds = divmod(video['duration'], 60)
+    initial_data = {
+        'contents': {'twoColumnWatchNextResults': {'results': {'results': {
+            'contents': [{'videoPrimaryInfoRenderer': {'videoActions': {
+                'menuRenderer': {'topLevelButtons': [
+                    _toggle_button('LIKE', video['likes']),
+                    _toggle_button('DISLIKE', video['dislikes'])
+                ]}
+            }}}]
+        }}}},
+        'playerOverlays': {'playerOverlayRenderer': {
+            'decoratedPlayerBarRenderer': {'decoratedPlayerBarRenderer': {
+                'playerBar': {'multiMarkersPlayerBarRenderer': {
+                    'markersMap': [{
+                        'key': 'DESCRIPTION_CHAPTERS',
+                        'value': {'chapters': [
+                            {'chapterRenderer': {
+                                'title': {'simpleText': chapter['title']},
+                                'timeRangeStartMillis': chapter['start'] * 1000
+                            }} for chapter in video['chapters']
+                        ]}
+                    }]
+                }}
+            }}
+        }}
+    }
+    player_response = {'videoDetails': {
+        'videoId': video['video_id'],
+        'viewCount': str(video['views']),
+        'keywords': video['keywords']
+    }}
+
+    metadata = (
+        '<div id="watch7-content" class="watch-main-col" itemscope '
+        'itemid="" itemtype="http://schema.org/VideoObject">'
+        f'<link itemprop="url" href="https://www.youtube.com/watch?v='
+        f'{video["video_id"]}">'
+        f'<meta itemprop="name" content="{video["title"]}">'
+        '<meta itemprop="description" content="A synthetic video.">'
+        '<meta itemprop="paid" content="False">'
+        f'<meta itemprop="channelId" content="{video["channel_id"]}">'
+        f'<meta itemprop="videoId" content="{video["video_id"]}">'
+        f'<meta itemprop="duration" content="PT{minutes}M{seconds}S">'
+        '<meta itemprop="unlisted" content="False">'
+        '<span itemprop="author" itemscope '
+        'itemtype="http://schema.org/Person">'
+        '<link itemprop="name" content="Synthetic"></span>'
+        '<meta itemprop="isFamilyFriendly" content="true">'
+        '<meta itemprop="regionsAllowed" content="AD,AE,AF">'
+        f'<meta itemprop="interactionCount" content="{video["views"]}">'
+        f'<meta itemprop="datePublished" content="{video["upload_date"]}">'
+        '<meta itemprop="genre" content="Gaming">'
+        '</div>'
+    )
+
+    # Real pages spend most of their bytes on markup and inline scripts
+    filler_markup = ''.join(
+        f'<div class="style-scope ytd-item-{i}"><span>item {i}</span>'
+        f'<a href="/watch?v={i:011d}">related</a></div>'
+        for i in range(page_size // 400))
+    filler_scripts = ''.join(
+        f'<script>var chunk{i} = "{"x" * 4000}";</script>'
+        for i in range(page_size // 8000))
+
+    page = (
+        '<!DOCTYPE html><html><head><title>'
+        f'{video["title"]} - YouTube</title>{filler_scripts}</head><body>'
+        f'{filler_markup}{metadata}'
+        '<script nonce="bench">var ytInitialPlayerResponse = '
+        f'{json.dumps(player_response)};var meta = null;</script>'
+        '<script nonce="bench">var ytInitialData = '
+        f'{json.dumps(initial_data)};</script>'
+        '</body></html>'
+    )
+
+    return page.encode('utf-8')
+
+
+def make_video_items(
+    channel_id: str,
+    video_ids: List[str],
+    offset: int
+) -> List[Dict]:
+    """
+    Render one batch of a channel's video grid, ending with a
+    continuation token when more videos follow.
+    """
+    batch = video_ids[offset:offset + CHANNEL_BATCH]
+    items = [{'gridVideoRenderer': {'videoId': v}} for v in batch]
+    if offset + CHANNEL_BATCH < len(video_ids):
+        items.append({'continuationItemRenderer': {'continuationEndpoint': {
+            'continuationCommand': {
+                'token': f'{channel_id}:{offset + CHANNEL_BATCH}'
+            }
+        }}})
+
+    return items
+
+
+def make_browse_response(
+    channel_id: str,
+    video_ids: List[str],
+    offset: int
+) -> Dict:
+    """Render the browse endpoint's answer to a continuation token."""
+    return {'onResponseReceivedActions': [{
+        'appendContinuationItemsAction': {
+            'continuationItems': make_video_items(
+                channel_id, video_ids, offset)
+        }
+    }]}
+
+
+def make_channel_page(channel_id: str, video_ids: List[str]) -> bytes:
+    """
+    Render a channel videos page that, like the real one, only shows
+    a batch of videos at first and appends more on every scroll. The
+    first batch is also embedded as ytInitialData, with a continuation
+    token for the browse endpoint.
+    """
+    initial_data = {'contents': {'twoColumnBrowseResultsRenderer': {'tabs': [
+        {'tabRenderer': {'content': {'sectionListRenderer': {'contents': [
+            {'itemSectionRenderer': {'contents': [{'gridRenderer': {
+                'items': make_video_items(channel_id, video_ids, 0)
+            }}]}}
+        ]}}}}
+    ]}}}
+    ytcfg = {
+        'INNERTUBE_API_KEY': 'bench-api-key',
+        'INNERTUBE_CLIENT_VERSION': '2.20210605.00.00'
+    }
+
+    page = '''<!DOCTYPE html><html><head><title>%s - YouTube</title>
+<style>a#video-title { display: block; height: 120px; }</style>
+<script>ytcfg.set(%s);</script>
+</head><body><div id="items"></div>
+<script>var ytInitialData = %s;</script>
+<script>
+var videoIds = %s;
+var shown = 0;
+function showMore() {
+    var items = document.getElementById('items');
+    videoIds.slice(shown, shown + 30).forEach(function (id) {
+        var a = document.createElement('a');
+        a.id = 'video-title';
+        a.href = '/watch?v=' + id;
+        a.textContent = id;
+        items.appendChild(a);
+    });
+    shown += 30;
+}
+window.addEventListener('scroll', function () {
+    var bottom = window.scrollY + window.innerHeight;
+    if (bottom >= document.documentElement.scrollHeight - 200) {
+        setTimeout(showMore, 50);
+    }
+});
+showMore();
+</script></body></html>''' % (
+        channel_id, json.dumps(ytcfg), json.dumps(initial_data),
+        json.dumps(video_ids))
+
+    return page.encode('utf-8')
+
+
+def generate_corpus(
+    corpus_dir: str,
+    n_videos: int,
+    channel_id: str = 'UCsyntheticbenchchannel',
+    page_size: int = DEFAULT_PAGE_SIZE,
+    seed: int = 0
+) -> List[Dict]:
+    """Write a synthetic channel and its watch pages into a corpus."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(corpus_dir, 'watch'), exist_ok=True)
+    os.makedirs(os.path.join(corpus_dir, 'channel'), exist_ok=True)
+
+    videos = []
+    for _ in range(n_videos):
+        video = make_video(make_video_id(rng), channel_id, rng)
+        path = os.path.join(corpus_dir, 'watch', video['video_id'] + '.html')
+        with open(path, 'wb') as f:
+            f.write(make_watch_page(video, page_size))
+        videos.append(video)
+
+    video_ids = [video['video_id'] for video in videos]
+    path = os.path.join(corpus_dir, 'channel', channel_id)
+    with open(path + '.html', 'wb') as f:
+        f.write(make_channel_page(channel_id, video_ids))
+    with open(path + '.json', 'w') as f:
+        json.dump(video_ids, f)
+
+    return videos
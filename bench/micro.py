@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the hot paths we run at volume: page parsing in
+video_scraper.py and the wrangling functions of explore.py.
+
+Each case is timed a few times and its median compared against the
+stored baseline; cases slower than the baseline by more than the
+threshold are flagged and make the run exit with status 1. Baselines
+are machine specific, so none is committed: record one with
+--save-baseline first. Cases without a baseline exit with status 2.
+
+Usage:
+    python -m bench.micro --save-baseline
+    python -m bench.micro --rows 10000,1000000 --threshold 0.2
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+import numpy as np
+import pandas as pd
+from bench import fixtures
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_ROWS = '10000,100000,1000000'
+
+
+# FIXTURES
+# ============================ #
+
+def load_pages(corpus_dir: str, n_pages: int) -> List[bytes]:
+    """Use recorded watch pages when there are any, else synthetic ones."""
+    watch_dir = os.path.join(corpus_dir, 'watch')
+    if os.path.isdir(watch_dir):
+        names = sorted(os.listdir(watch_dir))[:n_pages]
+        pages = []
+        for name in names:
+            with open(os.path.join(watch_dir, name), 'rb') as f:
+                pages.append(f.read())
+        if pages:
+            return pages
+
+    rng = random.Random(0)
+    return [
+        fixtures.make_watch_page(
+            fixtures.make_video(fixtures.make_video_id(rng), 'UCbench', rng))
+        for _ in range(n_pages)
+    ]
+
+
+def make_scrape_frame(n_rows: int, n_channels: int = 2) -> pd.DataFrame:
+    """Build a frame shaped like the loaded scrapes, with random values."""
+    rng = np.random.default_rng(0)
+    days = rng.integers(0, 7 * 365, n_rows)
+    upload_date = pd.Timestamp('2014-03-11') + pd.to_timedelta(days, 'D')
+    views = rng.integers(1_000, 500_000, n_rows)
+
+    return pd.DataFrame({
+        'title': 'Synthetic video | Hearthstone',
+        'channel_id': rng.choice(
+            [f'UCchannel{i}' for i in range(n_channels)], n_rows),
+        'upload_date': upload_date.strftime('%Y-%m-%d'),
+        'duration': rng.integers(60, 3600, n_rows).astype(float),
+        'views': views,
+        'likes': views // rng.integers(20, 60, n_rows),
+        'dislikes': (views // rng.integers(500, 3000, n_rows)).astype(float),
+        'scrape_date': '2021-06-06',
+        'channel': 'synthetic'
+    })
+
+
+# CASES
+# ============================ #
+
+def parse_cases(pages: List[bytes]) -> Dict:
+    """Cases over the stored pages, timed per page."""
+    import video_scraper
+
+    url = 'https://www.youtube.com/watch?v=benchmark00'
+    responses = [video_scraper.scrape_video_data(url, p) for p in pages]
+
+    def each(function: Callable, items: List) -> Callable:
+        return lambda: [function(item) for item in items]
+
+    return {
+        'make_soup': (None, each(
+            lambda p: video_scraper.make_soup(url, p), pages)),
+        'scrape_video_data[full]': (None, each(
+            lambda p: video_scraper.scrape_video_data(url, p, 'full'),
+            pages)),
+        'scrape_video_data[fast]': (None, each(
+            lambda p: video_scraper.scrape_video_data(url, p, 'fast'),
+            pages)),
+        'extract_metadata': (None, each(
+            lambda r: video_scraper.extract_metadata(r, '2021-06-06'),
+            responses))
+    }
+
+
+def wrangling_cases(n_rows: int) -> Dict:
+    """Cases over a synthetic frame; setup builds a fresh copy each run."""
+    import explore
+
+    raw = make_scrape_frame(n_rows)
+    wrangled = explore.basic_wrangling(raw.copy())
+    engineered = explore.meta_function_feature_engineering(wrangled.copy())
+    engineered['channel'] = raw['channel_id'].values
+
+    return {
+        f'basic_wrangling[{n_rows}]': (
+            lambda: raw.copy(), explore.basic_wrangling),
+        f'to_datetime[{n_rows}]': (
+            lambda: raw.copy(),
+            lambda df: explore.to_datetime(df, 'upload_date')),
+        f'meta_function_feature_engineering[{n_rows}]': (
+            lambda: wrangled.copy(),
+            explore.meta_function_feature_engineering),
+        f'calculate_totals[{n_rows}]': (
+            lambda: engineered, explore.calculate_totals),
+        f'calculate_statistics[{n_rows}]': (
+            lambda: engineered, explore.calculate_statistics),
+        f'create_time_components[{n_rows}]': (
+            lambda: engineered,
+            lambda df: explore.create_time_components(df, 'upload_date'))
+    }
+
+
+def time_case(setup: Callable, run: Callable, repeat: int) -> float:
+    """Median wall time of `run`, excluding the time spent in `setup`."""
+    timings = []
+    for _ in range(repeat):
+        if setup is None:
+            start = time.perf_counter()
+            run()
+        else:
+            data = setup()
+            start = time.perf_counter()
+            run(data)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print results against the baseline and list the regressions."""
+    regressions = []
+    print(f"\n{'case':<48}{'seconds':>12}{'baseline':>12}{'change':>10}")
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base:
+            change = seconds / base - 1
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            print(f"{name:<48}{seconds:>12.4f}{base:>12.4f}"
+                  f"{change:>+10.1%}{flag}")
+        else:
+            print(f"{name:<48}{seconds:>12.4f}{'-':>12}{'-':>10}")
+
+    return regressions
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--corpus', default='bench/corpus')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument(
+        '--rows', default=DEFAULT_ROWS,
+        help='comma separated frame sizes, e.g. 10000,1000000,10000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='only run cases containing this')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    cases = parse_cases(load_pages(args.corpus, args.pages))
+    for n_rows in [int(n) for n in args.rows.split(',') if n]:
+        cases.update(wrangling_cases(n_rows))
+    if args.only:
+        cases = {k: v for k, v in cases.items() if args.only in k}
+
+    results = {}
+    for name, (setup, run) in cases.items():
+        results[name] = time_case(setup, run, args.repeat)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    # Timings only compare on the machine that recorded them
+    missing = [name for name in results if name not in baseline]
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif missing:
+        print(f"\n*\nNo baseline for {len(missing)} case(s) in "
+              f"{args.baseline}, nothing to check them against. "
+              "Run with --save-baseline on this machine first.")
+        sys.exit(2)
+    elif regressions:
+        print(f"\n{len(regressions)} case(s) slower than the baseline by "
+              f"more than {args.threshold:.0%}")
+        sys.exit(1)
@@ -0,0 +1,287 @@
+"""
+Local HTTP server replaying a recorded corpus of YouTube pages.
+
+Corpus layout:
+    <corpus>/watch/<video_id>.html      watch pages
+    <corpus>/channel/<channel_id>.html  channel videos pages
+    <corpus>/channel/<channel_id>.json  all of the channel's video IDs,
+                                        served through continuations
+
+Usage:
+    python -m bench.replay_server record --links data/links/X.list \
+        --corpus bench/corpus --limit 200
+    python -m bench.replay_server synthesize --corpus bench/corpus
+    python -m bench.replay_server serve --corpus bench/corpus \
+        --latency-ms 80 --error-rate 0.02
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+import http_client
+from bench import fixtures
+
+
+# DEFINE HELPER FUNCTIONS
+# ============================ #
+
+class Corpus:
+    """Pages of a corpus directory, kept in memory once read."""
+
+    def __init__(self, corpus_dir: str):
+        self.pages = {}
+        self.compressed = {}
+        for kind in ('watch', 'channel'):
+            directory = os.path.join(corpus_dir, kind)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.html'):
+                    continue
+                with open(os.path.join(directory, name), 'rb') as f:
+                    self.pages[(kind, name[:-len('.html')])] = f.read()
+        self.channel_videos = {}
+        self.continuations = {}
+        channel_dir = os.path.join(corpus_dir, 'channel')
+        if os.path.isdir(channel_dir):
+            for name in os.listdir(channel_dir):
+                if name.endswith('.json'):
+                    with open(os.path.join(channel_dir, name)) as f:
+                        self.channel_videos[name[:-len('.json')]] = \
+                            json.load(f)
+        self.watch_ids = [key for kind, key in self.pages if kind == 'watch']
+        if not self.watch_ids:
+            raise ValueError(f"No watch pages found in {corpus_dir}")
+
+    def watch_page(self, video_id: str) -> bytes:
+        """
+        Return the recorded page of the video. Unknown IDs map onto a
+        recorded page, so any links list can be replayed.
+        """
+        page = self.pages.get(('watch', video_id))
+        if page is None:
+            index = zlib.crc32(video_id.encode('utf-8')) % len(self.watch_ids)
+            page = self.pages[('watch', self.watch_ids[index])]
+
+        return page
+
+    def channel_page(self, channel_id: str) -> bytes:
+        """Return the recorded videos page of the channel, or None."""
+        return self.pages.get(('channel', channel_id))
+
+    def continuation(self, token: str) -> bytes:
+        """Answer a continuation token of the form '<channel>:<offset>'."""
+        channel_id, _, offset = token.rpartition(':')
+        video_ids = self.channel_videos.get(channel_id)
+        if video_ids is None or not offset.isdigit():
+            return None
+        # Kept like the pages, so gzipped() can cache by id
+        if token not in self.continuations:
+            response = fixtures.make_browse_response(
+                channel_id, video_ids, int(offset))
+            self.continuations[token] = json.dumps(response).encode('utf-8')
+
+        return self.continuations[token]
+
+    def gzipped(self, page: bytes) -> bytes:
+        """Return the page gzip-compressed, compressing it only once."""
+        # Pages stay referenced by self.pages, so their ids are stable
+        key = id(page)
+        if key not in self.compressed:
+            self.compressed[key] = gzip.compress(page, compresslevel=6)
+
+        return self.compressed[key]
+
+
+def make_handler(
+    corpus: Corpus,
+    latency_ms: float,
+    jitter_ms: float,
+    error_rate: float,
+    error_statuses: List[int]
+) -> type:
+    """Build a request handler class bound to the corpus and settings."""
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def delay_or_fail(self) -> bool:
+            """Apply the latency and return True when injecting an error."""
+            delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+            time.sleep(max(0.0, delay) / 1000)
+
+            if random.random() < error_rate:
+                self.send_page(random.choice(error_statuses), b'')
+                return True
+
+            return False
+
+        def do_GET(self):
+            if self.delay_or_fail():
+                return
+
+            url = urlparse(self.path)
+            parts = url.path.strip('/').split('/')
+            if parts[0] == 'watch':
+                video_id = parse_qs(url.query).get('v', [''])[0]
+                self.send_page(200, corpus.watch_page(video_id))
+            elif len(parts) >= 2 and parts[0] in ('channel', 'c', 'user'):
+                page = corpus.channel_page(parts[1])
+                self.send_page(404 if page is None else 200, page or b'')
+            else:
+                self.send_page(404, b'')
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.delay_or_fail():
+                return
+
+            page = None
+            if urlparse(self.path).path == '/youtubei/v1/browse':
+                token = json.loads(body or b'{}').get('continuation', '')
+                page = corpus.continuation(token)
+            self.send_page(404 if page is None else 200, page or b'')
+
+        def send_page(self, status: int, page: bytes) -> None:
+            accept = self.headers.get('Accept-Encoding', '')
+            self.send_response(status)
+            if page and 'gzip' in accept:
+                page = corpus.gzipped(page)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+class ReplayServer:
+    """Replay server running in a background thread."""
+
+    def __init__(
+        self,
+        corpus_dir: str,
+        port: int = 0,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        error_statuses: List[int] = (503,)
+    ):
+        handler = make_handler(
+            Corpus(corpus_dir), latency_ms, jitter_ms,
+            error_rate, list(error_statuses))
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'ReplayServer':
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# RECORDING
+# ============================ #
+
+def record_corpus(
+    links_list: str,
+    corpus_dir: str,
+    limit: int,
+    channel_urls: List[str]
+) -> Dict:
+    """Fetch watch pages (and channel pages) from the web into a corpus."""
+    os.makedirs(os.path.join(corpus_dir, 'watch'), exist_ok=True)
+    os.makedirs(os.path.join(corpus_dir, 'channel'), exist_ok=True)
+    client = http_client.get_client()
+    counts = {'watch': 0, 'channel': 0}
+
+    with open(links_list) as f:
+        urls = [line.strip() for line in f if line.strip()][:limit]
+    for url in urls:
+        video_id = parse_qs(urlparse(url).query).get('v', [None])[0]
+        if video_id is None:
+            continue
+        with open(os.path.join(corpus_dir, 'watch', video_id + '.html'),
+                  'wb') as f:
+            f.write(client.get(url))
+        counts['watch'] += 1
+
+    for url in channel_urls:
+        channel_id = urlparse(url).path.strip('/').split('/')[1]
+        with open(os.path.join(corpus_dir, 'channel', channel_id + '.html'),
+                  'wb') as f:
+            f.write(client.get(url))
+        counts['channel'] += 1
+
+    return counts
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='record pages from the web')
+    record.add_argument('--links', required=True)
+    record.add_argument('--corpus', default='bench/corpus')
+    record.add_argument('--limit', type=int, default=200)
+    record.add_argument('--channel', action='append', default=[])
+
+    synthesize = commands.add_parser(
+        'synthesize', help='generate a synthetic corpus')
+    synthesize.add_argument('--corpus', default='bench/corpus')
+    synthesize.add_argument('--videos', type=int, default=200)
+    synthesize.add_argument(
+        '--page-size', type=int, default=fixtures.DEFAULT_PAGE_SIZE)
+
+    serve = commands.add_parser('serve', help='replay a corpus over HTTP')
+    serve.add_argument('--corpus', default='bench/corpus')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--latency-ms', type=float, default=0)
+    serve.add_argument('--jitter-ms', type=float, default=0)
+    serve.add_argument('--error-rate', type=float, default=0)
+    serve.add_argument(
+        '--error-statuses', type=lambda s: [int(x) for x in s.split(',')],
+        default=[503])
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        counts = record_corpus(
+            args.links, args.corpus, args.limit, args.channel)
+        print(f"Recorded {counts['watch']} watch pages and "
+              f"{counts['channel']} channel pages into {args.corpus}")
+    elif args.command == 'synthesize':
+        videos = fixtures.generate_corpus(
+            args.corpus, args.videos, page_size=args.page_size)
+        print(f"Generated {len(videos)} watch pages into {args.corpus}")
+    else:
+        server = ReplayServer(
+            args.corpus, args.port, args.latency_ms, args.jitter_ms,
+            args.error_rate, args.error_statuses)
+        print(f"Replaying {args.corpus} on {server.base_url}")
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,182 @@
+"""
+A fixed pool of long-lived headless Chrome workers.
+Browsers are started the first time they're needed and then reused
+across channels, each with its own profile directory so parallel
+workers never fight over the same Chrome user data.
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+import rate_limiter
+
+
+# Options read from the channel scraper's configuration file
+DEFAULT_OPTIONS = {
+    'BROWSER_WORKERS': 2,
+    'CHROMEDRIVER_PATH': None,
+    'PROFILE_DIR': 'chrome-data',
+    'HEADLESS': True
+}
+
+
+def make_chrome(
+    chromedriver_path: str = None,
+    profile_dir: str = None,
+    headless: bool = True
+) -> webdriver.Chrome:
+    """
+    Start a Chrome driver. Without a chromedriver path the one on the
+    PATH is used.
+    """
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--window-size=1280,2000")
+    if profile_dir:
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--mute-audio")
+
+    if chromedriver_path:
+        return webdriver.Chrome(
+            executable_path=chromedriver_path, options=chrome_options)
+
+    return webdriver.Chrome(options=chrome_options)
+
+
+def alive(driver: webdriver.Chrome) -> bool:
+    """Check that the browser behind a driver still answers."""
+    try:
+        driver.current_url
+    except Exception:
+        # A dead chromedriver fails with connection errors, not just
+        # WebDriverException
+        return False
+
+    return True
+
+
+class BrowserPool:
+    """Up to `size` Chrome workers, lent out one channel at a time."""
+
+    def __init__(
+        self,
+        size: int,
+        chromedriver_path: str = None,
+        profile_dir: str = 'chrome-data',
+        headless: bool = True,
+        limiter_options: Dict = None
+    ):
+        self.size = size
+        self.limiter_options = limiter_options or {}
+        self.chromedriver_path = chromedriver_path
+        self.profile_dir = profile_dir
+        self.headless = headless
+        self.idle = queue.Queue()
+        # Worker numbers not running a browser, each with its own profile
+        self.free_workers = list(range(size - 1, -1, -1))
+        self.drivers = set()
+        self.lock = threading.Lock()
+
+    def _start(self, worker: int) -> webdriver.Chrome:
+        profile = None
+        if self.profile_dir:
+            profile = os.path.abspath(
+                os.path.join(self.profile_dir, f'worker-{worker}'))
+        driver = make_chrome(self.chromedriver_path, profile, self.headless)
+        driver.worker = worker
+        # Each browser paces its own page loads and scrolls, so the
+        # workers harvest side by side instead of sharing one bucket
+        driver.limiter = rate_limiter.from_options(self.limiter_options)
+        with self.lock:
+            self.drivers.add(driver)
+
+        return driver
+
+    def _checkout(self) -> webdriver.Chrome:
+        """Take an idle driver, start a new one, or wait for one."""
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                driver = None
+            if driver is not None:
+                return driver
+
+            with self.lock:
+                worker = self.free_workers.pop() if self.free_workers else None
+            if worker is not None:
+                try:
+                    return self._start(worker)
+                except Exception:
+                    self._release(worker)
+                    raise
+
+            # None is put on the queue when a worker frees up, see _release
+            driver = self.idle.get()
+            if driver is not None:
+                return driver
+
+    def _release(self, worker: int) -> None:
+        """Give a worker number back and wake up one waiting thread."""
+        with self.lock:
+            self.free_workers.append(worker)
+        self.idle.put(None)
+
+    def _discard(self, driver: webdriver.Chrome) -> None:
+        """Quit a broken driver so its worker can start a fresh one."""
+        with self.lock:
+            self.drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self._release(driver.worker)
+
+    @contextmanager
+    def driver(self):
+        """
+        Borrow a driver. It goes back to the pool however the block
+        ends, unless its browser died, in which case it's replaced.
+        """
+        driver = self._checkout()
+        try:
+            yield driver
+        finally:
+            if alive(driver):
+                self.idle.put(driver)
+            else:
+                self._discard(driver)
+
+    def close(self) -> None:
+        """Quit every browser of the pool."""
+        with self.lock:
+            drivers = list(self.drivers)
+            self.drivers.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def from_options(options: Dict) -> BrowserPool:
+    """Build a browser pool from the scraper's configuration options."""
+    options = dict(DEFAULT_OPTIONS, **options)
+
+    return BrowserPool(
+        size=options['BROWSER_WORKERS'],
+        chromedriver_path=options['CHROMEDRIVER_PATH'],
+        profile_dir=options['PROFILE_DIR'],
+        headless=options['HEADLESS'],
+        limiter_options=options)
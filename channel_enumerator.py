@@ -0,0 +1,106 @@
+"""
+Browserless channel video enumeration.
+Reads the videos embedded in a channel's videos page (ytInitialData)
+and then follows the continuation tokens through YouTube's browse
+endpoint page by page, the same requests the page makes while you
+scroll, so no browser is needed.
+"""
+import re
+from typing import Dict, Iterator, List, Tuple
+from urllib.parse import urljoin
+import http_client
+import rate_limiter
+import yt_data
+
+
+WATCH_URL = 'https://www.youtube.com/watch?v={}'
+BROWSE_PATH = '/youtubei/v1/browse?key={}'
+
+# Renderers the channel pages list videos with
+VIDEO_RENDERERS = ('gridVideoRenderer', 'videoRenderer')
+
+
+class EnumerationError(Exception):
+    """Raised when a channel page doesn't have the expected data."""
+
+
+def extract_innertube_config(page: bytes) -> Dict:
+    """Read the API key and client version the page talks to the API with."""
+    config = {}
+    for key in ('INNERTUBE_API_KEY', 'INNERTUBE_CLIENT_VERSION'):
+        match = re.search(
+            b'"' + key.encode('utf-8') + rb'"\s*:\s*"([^"]+)"', page)
+        if match is None:
+            raise EnumerationError(f"{key} not found on the channel page")
+        config[key] = match.group(1).decode('utf-8')
+
+    return config
+
+
+def find_videos(obj) -> Tuple[List[str], str]:
+    """
+    Walk a decoded page or continuation response and return the video
+    IDs it lists, in order, along with the next continuation token.
+    """
+    video_ids, token = [], None
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for renderer in VIDEO_RENDERERS:
+                video_id = yt_data.get_path(node, (renderer, 'videoId'))
+                if video_id is not None:
+                    video_ids.append(video_id)
+            continuation = yt_data.get_path(node, (
+                'continuationItemRenderer', 'continuationEndpoint',
+                'continuationCommand', 'token'))
+            if continuation is not None:
+                token = continuation
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+    return list(dict.fromkeys(video_ids)), token
+
+
+def enumerate_channel(
+    url: str,
+    limiter: rate_limiter.AdaptiveLimiter = None,
+    client: http_client.HttpClient = None
+) -> Iterator[str]:
+    """
+    Yield the IDs of a channel's videos, newest first, fetching one
+    page of results at a time. `url` is the channel's /videos page.
+    """
+    client = client or http_client.get_client()
+
+    if limiter is not None:
+        limiter.wait(url)
+    page = client.get(url)
+    initial_data = yt_data.find_embedded_json(page, 'ytInitialData')
+    if initial_data is None:
+        raise EnumerationError(f"No ytInitialData on {url}")
+    config = extract_innertube_config(page)
+
+    video_ids, token = find_videos(initial_data)
+    yield from video_ids
+
+    browse_url = urljoin(url, BROWSE_PATH.format(config['INNERTUBE_API_KEY']))
+    while token:
+        if limiter is not None:
+            limiter.wait(browse_url)
+        response = client.post_json(browse_url, {
+            'context': {'client': {
+                'clientName': 'WEB',
+                'clientVersion': config['INNERTUBE_CLIENT_VERSION'],
+                'hl': 'en'
+            }},
+            'continuation': token
+        })
+        video_ids, token = find_videos(response)
+        yield from video_ids
+
+
+def watch_url(video_id: str) -> str:
+    """Build the watch page URL of a video."""
+    return WATCH_URL.format(video_id)
@@ -1,19 +1,51 @@
 # %%
 """
-Use Selenium to browse through a channel's videos page.
-Extract the URLs to all the videos in the channel.
+Extract the URLs to all the videos in a list of channels.
+By default the videos are listed over plain HTTP by following the
+channel's continuation tokens (see channel_enumerator.py); Selenium
+browsing through the channel's videos page is kept as a fallback.
+Channels are harvested in parallel, and the browsers the fallback
+needs come from a pool of headless workers reused across channels.
 URLs will be parsed later for extracting other information.
-Solution based on:
+Selenium solution based on:
 https://github.com/banhao/scrape-youtube-channel-videos-url/blob/master/scrape-youtube-channel-videos-url.py
 """
 import sys
 import os
-from time import time, sleep
-import datetime
+import glob
+from time import time
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import random
+from selenium.common.exceptions import WebDriverException
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Set, Tuple
+import browser_pool
+import channel_enumerator
+import http_client
+import link_store
+import metrics
+import rate_limiter
+import video_scraper
+
+
+# Collects the links of the titles appended since the given count
+# (skipping titles that aren't links), then scrolls to the bottom so
+# the next batch starts loading while we wait
+HARVEST_SCRIPT = """
+var titles = document.querySelectorAll('#video-title');
+var links = [];
+for (var i = arguments[0]; i < titles.length; i++) {
+    if (titles[i].href) {
+        links.push(titles[i].href);
+    }
+}
+var height = document.documentElement.scrollHeight;
+window.scrollTo(0, height);
+return [links, height, titles.length];
+"""
+
+# Links handed on at a time while enumerating, one page of the grid
+ENUMERATE_BATCH = 30
 
 
 # DEFINE HELPER FUNCTIONS
@@ -43,11 +75,188 @@ def load_configuration_file(optionsPath: str):
         return False
 
 
+def seed_link_store(
+    store: link_store.LinkStore,
+    list_dir: str,
+    channel_id: str
+) -> None:
+    """
+    Import the .list files earlier runs saved for a channel, the first
+    time the channel is harvested into the store.
+    """
+    if store.known_ids(channel_id):
+        return
+    paths = glob.glob(os.path.join(list_dir, channel_id + '.list'))
+    paths += glob.glob(os.path.join(list_dir, channel_id + '-*.list'))
+    for path in sorted(paths, reverse=True):
+        added = store.import_list(path, channel_id)
+        print(f"Imported {added:,} links from {path}")
+    # Earlier runs only saved their list after scrolling to the end
+    if paths:
+        store.mark_harvested(channel_id, complete=True)
+
+
+def until_known(links: List, known_ids: Set[str]) -> Tuple[List, bool]:
+    """Cut the links at the first already known video."""
+    for i, link in enumerate(links):
+        if video_scraper.video_id_from_url(link) in known_ids:
+            return links[:i], True
+
+    return links, False
+
+
+def enumerate_channel_links(
+    url: str,
+    limiter: rate_limiter.AdaptiveLimiter,
+    known_ids: Set[str] = frozenset(),
+    on_links: Callable[[List], None] = None
+) -> List:
+    """
+    List the links to a channel's videos over HTTP, without a browser.
+    Videos come newest first, so listing stops at the first known one
+    and no further pages are requested. Links are passed on to
+    `on_links` a page's worth at a time as they come in.
+    """
+    links, batch = [], []
+    for video_id in channel_enumerator.enumerate_channel(url, limiter):
+        if video_id in known_ids:
+            break
+        batch.append(channel_enumerator.watch_url(video_id))
+        if len(batch) == ENUMERATE_BATCH:
+            links.extend(batch)
+            if on_links is not None:
+                on_links(batch)
+            batch = []
+    links.extend(batch)
+    if batch and on_links is not None:
+        on_links(batch)
+
+    return links
+
+
+class PartialHarvest(list):
+    """Links of a harvest that stopped before the end of the channel."""
+
+
+def harvest_channel_links(
+    driver: webdriver.Chrome,
+    url: str,
+    limiter: rate_limiter.AdaptiveLimiter,
+    on_links: Callable[[List], None] = None,
+    known_ids: Set[str] = frozenset()
+) -> List:
+    """
+    Open a channel's videos page, scroll until no more videos load
+    and return the links to all of them. Each scroll step is a single
+    script call that hands back the links appended since the last one,
+    which are passed to `on_links` as they come in. Scrolling stops
+    early once a video in `known_ids` shows up. If the browser dies,
+    the links found so far come back as a PartialHarvest.
+    """
+    limiter.wait(url)
+    driver.get(url)
+    limiter.wait(url)
+    links = []
+    titles_seen = 0
+    lastheight = None
+
+    # Scrolling through the page
+    # -------------------------------------- #
+    try:
+        while True:
+            new_links, height, titles_seen = driver.execute_script(
+                HARVEST_SCRIPT, titles_seen)
+            new_links, reached_known = until_known(new_links, known_ids)
+            links.extend(new_links)
+            if new_links and on_links is not None:
+                on_links(new_links)
+            if reached_known or (height == lastheight and not new_links):
+                break
+            lastheight = height
+            limiter.wait(url)
+    except WebDriverException as e:
+        print(f"*\nBrowser failed mid-scroll ({e.msg}), "
+              f"keeping the {len(links)} links found so far.")
+        return PartialHarvest(links)
+
+    return links
+
+
+def harvest_channel(
+    url: str,
+    store: link_store.LinkStore,
+    limiter: rate_limiter.AdaptiveLimiter,
+    pool: browser_pool.BrowserPool,
+    enumerator: str = "http",
+    incremental: bool = False,
+    on_links: Callable[[List], None] = None
+) -> Dict:
+    """
+    Harvest one channel into the link store, over HTTP when possible
+    and otherwise with a browser borrowed from the pool. Links are also
+    passed to `on_links`, if given, as soon as they are stored.
+    """
+    channel_id = url.split('/')[4]
+    seed_link_store(store, os.path.dirname(store.path), channel_id)
+    stored_before = len(store.known_ids(channel_id))
+
+    # In incremental mode only the uploads since the last run are listed,
+    # but only once a harvest went all the way through the channel:
+    # after an interrupted one the older videos are still missing
+    known_ids = set()
+    if incremental and store.is_complete(channel_id):
+        known_ids = store.known_ids(channel_id)
+
+    # Links are stored as they are found, so a run that dies part way
+    # through still keeps the ones harvested until then
+    def save_links(new_links: List) -> None:
+        with metrics.timer('write'):
+            store.add_links(channel_id, new_links)
+        metrics.inc('links_found_total', len(new_links))
+        if on_links is not None:
+            on_links(new_links)
+
+    # List the videos over HTTP
+    # -------------------------------------- #
+    links = None
+    if enumerator == "http":
+        try:
+            with metrics.timer('harvest', enumerator='http'):
+                links = enumerate_channel_links(
+                    url, limiter, known_ids, save_links)
+        except Exception as e:
+            metrics.inc('harvest_errors_total', error=type(e).__name__)
+            print(f"*\n{channel_id}: HTTP enumeration failed "
+                  f"({type(e).__name__}: {e}).")
+        # No new uploads is fine, an empty channel is suspicious
+        if not links and not known_ids:
+            links = None
+        if links is None:
+            print(f"{channel_id}: falling back to Selenium.")
+
+    # Fall back to scrolling with a pooled browser
+    # -------------------------------------- #
+    if links is None:
+        with pool.driver() as driver, \
+                metrics.timer('harvest', enumerator='selenium'):
+            links = harvest_channel_links(
+                driver, url, driver.limiter, save_links, known_ids)
+    complete = not isinstance(links, PartialHarvest)
+    metrics.inc('harvests_total', complete=complete)
+    store.mark_harvested(channel_id, complete)
+
+    return {
+        'channel_id': channel_id,
+        'found': len(links),
+        'new': len(store.known_ids(channel_id)) - stored_before,
+        'complete': complete
+    }
+
+
 # THE MAIN METHOD
 # ============================ #
 if __name__ == "__main__":
     runtime_start = time()
-    random_generator = random.randint(0, 36)
 
     # Unpack the configuration options
     # -------------------------------------- #
@@ -64,54 +273,43 @@ if __name__ == "__main__":
         for option in config_options.keys():
             print(f"\t* {option}: {config_options[option]}")
         print()
-        url = config_options["INPUT_PATH"]
-        output_path = config_options["OUTPUT_PATH"]
-
-    # Set up the driver
-    # -------------------------------------- #
-
-    # Don't foget to get the type of Chromedriver you need,
-    # save it on disk somwhere and then specify the path to it
-    # as per this answer on StackOverflow:
-    # https://stackoverflow.com/questions/42478591/python-selenium-chrome-webdriver
-
-    chrome_options = Options()
-    chrome_options.add_argument("--user-data-dir=chrome-data")
-    driver = webdriver.Chrome(executable_path=r"C:\\chromedriver.exe")
+        channel_urls = config_options.get("INPUT_PATHS") or [
+            config_options["INPUT_PATH"]]
+        store_path = config_options.get(
+            "LINK_STORE_PATH", "data/links/links.db")
+        enumerator = config_options.get("ENUMERATOR", "http")
+        incremental = config_options.get("INCREMENTAL", False)
+        limiter = rate_limiter.from_options(config_options)
+        http_client.configure(config_options)
 
-    # Start up the driver
+    # Harvest the channels in parallel
     # -------------------------------------- #
-    channel_id = url.split('/')[4]
-    print(f"\nScraping channel id: {channel_id}")
-    driver.get(url)
-    sleep(random_generator)
-    dt = datetime.datetime.now().strftime("%Y%m%d%H%M")
-    height = driver.execute_script(
-        "return document.documentElement.scrollHeight")
-    lastheight = 0
-
-    # Scrolling through the page
-    # -------------------------------------- #
-    while True:
-        if lastheight == height:
-            break
-        lastheight = height
-        driver.execute_script("window.scrollTo(0, " + str(height) + ");")
-        sleep(random_generator)
-        height = driver.execute_script(
-            "return document.documentElement.scrollHeight")
-
-    user_data = driver.find_elements_by_xpath('//*[@id="video-title"]')
-
-    # SAVING THE USER DATA
-    # ============================ #
-    print(user_data)
-    for i in user_data:
-        print(i.get_attribute('href'))
-        link = (i.get_attribute('href'))
-        f = open(output_path + channel_id + '-' + dt + '.list', 'a+')
-        f.write(link + '\n')
-    f.close
+    # Browsers only start when a channel falls back to Selenium, and
+    # are then reused by the following channels
+    print(f"\nScraping {len(channel_urls)} channel(s).")
+    store = link_store.LinkStore(store_path)
+    pool = browser_pool.from_options(config_options)
+    exporter = metrics.from_options(config_options)
+    with exporter, pool, ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = {
+            executor.submit(
+                harvest_channel, url, store, limiter, pool,
+                enumerator, incremental): url
+            for url in channel_urls
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"*\nFailed to harvest {futures[future]} "
+                      f"({type(e).__name__}: {e}).")
+                continue
+            print(f"{result['channel_id']}: found {result['found']} links, "
+                  f"{result['new']} of them new.")
+            if not result['complete']:
+                print(f"{result['channel_id']}: harvest interrupted, the "
+                      f"next run crawls the whole channel again.")
+    store.close()
 
     # Keeping track of runtime.
     # -------------------------------------- #
@@ -7,8 +7,10 @@ import matplotlib.pyplot as plt
 from matplotlib import rcParams
 import seaborn as sns
 from datetime import datetime
+import os
 import warnings
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
+import aggregate_store
 
 warnings.filterwarnings('ignore')
 sns.set_style('darkgrid')
@@ -16,13 +18,97 @@ sns.set_style('darkgrid')
 # LOAD SCRAPED DATASETS
 # ============================ #
 SCRAPES_PATH = 'data/scrapes/'
-rarran = pd.read_json(SCRAPES_PATH + 'rarran.json')
-regis = pd.read_json(SCRAPES_PATH + 'regis.json')
 
-CHANNEL_DICT = {
-    'rarran': rarran,
-    'regis': regis
-}
+# Columns the analysis below uses
+SCRAPE_COLUMNS = [
+    'video_id', 'title', 'upload_date', 'duration',
+    'views', 'likes', 'dislikes'
+]
+
+# Scrape formats, in the order they are preferred
+SCRAPE_EXTENSIONS = ('.parquet', '.jsonl', '.json')
+
+# Rows read from a scrape at a time by read_scrape_chunks
+CHUNK_ROWS = 100000
+
+
+def arrow_to_pandas(table) -> pd.DataFrame:
+    """A pyarrow table or batch as a frame of the scrape's dtypes."""
+    import pyarrow as pa
+
+    # Dates come out as datetime64, counts as nullable integers
+    return table.to_pandas(
+        date_as_object=False,
+        types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def read_scrape(name: str, columns: List = None) -> pd.DataFrame:
+    """
+    Read a channel's scrape: a typed Parquet file (OUTPUT_FORMAT
+    parquet), reading only the given columns, or else the JSON Lines
+    file the video scraper streams to, or else a plain JSON file.
+    """
+    path = SCRAPES_PATH + name
+    if os.path.isfile(path + '.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path + '.parquet', columns=columns)
+        return arrow_to_pandas(table)
+    if os.path.isfile(path + '.jsonl'):
+        return pd.read_json(path + '.jsonl', lines=True)
+
+    return pd.read_json(path + '.json')
+
+
+def discover_scrapes() -> List[str]:
+    """Names of the channels scraped into SCRAPES_PATH, e.g. 'regis'."""
+    names = set()
+    for filename in os.listdir(SCRAPES_PATH):
+        name, extension = os.path.splitext(filename)
+        # Dead-letter files of failed links (*.failed.jsonl) aren't scrapes
+        if extension in SCRAPE_EXTENSIONS and not name.endswith('.failed'):
+            names.add(name)
+
+    return sorted(names)
+
+
+def read_scrape_chunks(
+    name: str,
+    chunksize: int = CHUNK_ROWS,
+    columns: List = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a channel's scrape like read_scrape, but as frames of at most
+    `chunksize` rows. Parquet row groups and JSON Lines are streamed
+    from disk; a plain JSON array can only be read whole, so it is
+    loaded once and then handed out in slices.
+    """
+    path = SCRAPES_PATH + name
+    if os.path.isfile(path + '.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path + '.parquet')
+        for batch in parquet.iter_batches(chunksize, columns=columns):
+            yield arrow_to_pandas(batch)
+        return
+    if os.path.isfile(path + '.jsonl'):
+        # Not a context manager in older pandas (1.1), so closed by hand
+        reader = pd.read_json(path + '.jsonl', lines=True, chunksize=chunksize)
+        try:
+            for chunk in reader:
+                yield chunk
+        finally:
+            reader.close()
+        return
+
+    data = pd.read_json(path + '.json')
+    for start in range(0, len(data), chunksize):
+        yield data.iloc[start:start + chunksize].reset_index(drop=True)
+
+
+# Only load the data when run as a script (or in the interactive
+# window), so the functions below can be imported by the benchmarks.
+if __name__ == "__main__":
+    # Every channel scraped into SCRAPES_PATH
+    CHANNEL_NAMES = discover_scrapes()
 
 # FUNCTION DEFINITIONS
 # ============================ #
@@ -30,9 +116,9 @@ CHANNEL_DICT = {
 
 def to_datetime(data: pd.DataFrame, colname: str) -> pd.DataFrame:
     """Transform a dataframe column from str to datetime."""
-    data[colname + "_dt"] = data[colname].apply(
-        lambda x: datetime.strptime(x, '%Y-%m-%d'))
-    data[colname + "_dt"] = pd.to_datetime(data[colname + "_dt"])
+    # A fixed format is parsed in one vectorized pass; the dates of
+    # Parquet scrapes are already typed and pass through untouched
+    data[colname + "_dt"] = pd.to_datetime(data[colname], format='%Y-%m-%d')
 
     return data
 
@@ -92,34 +178,30 @@ def get_channel_name(data: pd.DataFrame, channel: str) -> pd.DataFrame:
 
 def sec_to_min(data: pd.DataFrame) -> pd.DataFrame:
     """Turns a column with values in seconds, to minutes."""
-    data['duration_m'] = data.duration.apply(lambda x: round(x / 60, 2))
+    data['duration_m'] = (data['duration'] / 60).round(2)
 
     return data
 
 
 def remove_columns(data: pd.DataFrame) -> pd.DataFrame:
-    """Remove very specific columns."""
-    data = data.drop(
-        [
-            'upload_date',
-            'channel_id',
-            'duration',
-            'scrape_date',
-            'upload_date'
-        ],
-        axis=1)
+    """Remove very specific columns, in place."""
+    # Scrapes read with SCRAPE_COLUMNS have no channel_id or scrape_date
+    for colname in ['upload_date', 'channel_id', 'duration', 'scrape_date']:
+        if colname in data:
+            del data[colname]
 
     return data
 
 
 def rename_columns(data: pd.DataFrame) -> pd.DataFrame:
-    """Rename very specific columns."""
-    data = data.rename(
+    """Rename very specific columns, in place."""
+    data.rename(
         {
             'upload_date_dt': 'upload_date',
             'duration_m': 'duration'
         },
-        axis=1)
+        axis=1,
+        inplace=True)
 
     return data
 
@@ -127,13 +209,20 @@ def rename_columns(data: pd.DataFrame) -> pd.DataFrame:
 def float_to_int(data: pd.DataFrame) -> pd.DataFrame:
     """Turn specific columns from float to integers."""
     data['duration'] = data['duration'].astype(int)
-    data['dislikes'] = data['dislikes'].astype(int)
+    # Older scrapes have likes as strings and both counts can be
+    # missing (YouTube hides dislikes), so they become nullable integers.
+    # Some old counts were scraped as fractions and are truncated.
+    data['likes'] = truncate(pd.to_numeric(data['likes']))
+    data['dislikes'] = truncate(pd.to_numeric(data['dislikes']))
 
     return data
 
 
 def basic_wrangling(data: pd.DataFrame) -> pd.DataFrame:
-    """Perform specific basic data wrangling on a dataframe."""
+    """
+    Perform specific basic data wrangling on a dataframe. Columns are
+    added, removed and renamed in place, without copying the frame.
+    """
     data = sec_to_min(data)
     data = to_datetime(data, 'upload_date')
     data = remove_columns(data)
@@ -329,14 +418,17 @@ def calculate_totals(df: pd.DataFrame) -> Dict:
     """Calculate some summed metrics for several features."""
     channel_age = calculate_channel_age(df)
     total_videos = df.shape[0]
-    total_views = sum(df['views'])
-    total_reactions = sum(df['reactions'])
-    total_likes = sum(df['likes'])
-    total_dislikes = sum(df['dislikes'])
-    total_duration = sum(df['duration'])
-    total_viewtime_days = int((sum(df['viewtime']) / 60) / 24)
+    total_views = int(df['views'].sum())
+    # Missing like/dislike counts are left out of the sums
+    total_reactions = int(df['reactions'].sum())
+    total_likes = int(df['likes'].sum())
+    total_dislikes = int(df['dislikes'].sum())
+    total_duration = int(df['duration'].sum())
+    total_viewtime_days = int((df['viewtime'].sum() / 60) / 24)
     total_viewtime_years = int(total_viewtime_days / 365)
-    total_like_dislike_ratio = int(total_likes / total_dislikes)
+    total_like_dislike_ratio = None
+    if total_dislikes:
+        total_like_dislike_ratio = int(total_likes / total_dislikes)
 
     TOTALS_DICT = {
         'channel_age': channel_age,
@@ -354,6 +446,11 @@ def calculate_totals(df: pd.DataFrame) -> Dict:
     return TOTALS_DICT
 
 
+def int_or_none(value) -> int:
+    """Truncate a value to an integer, keeping missing values as None."""
+    return None if pd.isna(value) else int(value)
+
+
 def calculate_averages(df: pd.DataFrame, totals_dict: Dict) -> Dict:
     """Calculate some averaged metrics for several features."""
     average_videos_per_day = totals_dict['total_videos'] / \
@@ -371,9 +468,10 @@ def calculate_averages(df: pd.DataFrame, totals_dict: Dict) -> Dict:
         'average_videos_per_week': int(average_videos_per_week),
         'average_duration': int(average_duration),
         'average_views_per_video': int(average_views_per_video),
-        'average_like_per_video': int(average_like_per_video),
-        'average_dislike_per_video': int(average_dislike_per_video),
-        'average_reactions_per_video': int(average_reactions_per_video)
+        'average_like_per_video': int_or_none(average_like_per_video),
+        'average_dislike_per_video': int_or_none(average_dislike_per_video),
+        'average_reactions_per_video': int_or_none(
+            average_reactions_per_video)
     }
 
     return AVERAGES_DICT
@@ -388,6 +486,134 @@ def meta_function_calculate_statistics(df: pd.DataFrame) -> Dict:
     return statistics
 
 
+def channel_partials(df: pd.DataFrame, by: str = 'channel') -> pd.DataFrame:
+    """
+    Sum, count and date range of every feature the statistics need,
+    per channel, in one groupby over a feature engineered frame.
+    Partials of several frames can be combined with merge_partials.
+    """
+    return df.groupby(by, sort=True).agg(
+        videos=('views', 'size'),
+        views=('views', 'sum'),
+        duration=('duration', 'sum'),
+        viewtime=('viewtime', 'sum'),
+        likes=('likes', 'sum'),
+        likes_count=('likes', 'count'),
+        dislikes=('dislikes', 'sum'),
+        dislikes_count=('dislikes', 'count'),
+        reactions=('reactions', 'sum'),
+        reactions_count=('reactions', 'count'),
+        first_upload=('upload_date', 'min'),
+        last_upload=('upload_date', 'max'))
+
+
+def merge_partials(partials: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combine channel partials computed over separate frames, keyed by
+    channel or by several levels (e.g. channel and month).
+    """
+    partials = pd.concat(partials)
+    merged = partials.groupby(
+        level=list(range(partials.index.nlevels)), sort=True)
+    sums = merged.sum(numeric_only=True)
+    sums['first_upload'] = merged['first_upload'].min()
+    sums['last_upload'] = merged['last_upload'].max()
+
+    return sums
+
+
+def truncate(values: pd.Series) -> pd.Series:
+    """Truncate to nullable integers, as int() does for one value."""
+    return np.trunc(values.astype(float)).astype('Int64')
+
+
+def finalize_statistics(partials: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn channel partials into the totals and averages of
+    meta_function_calculate_statistics, one row per channel.
+    """
+    p = partials
+    age = (p['last_upload'] - p['first_upload']).dt.days
+    days = age.where(age > 0)
+    stats = pd.DataFrame(index=p.index)
+
+    stats['channel_age'] = age
+    stats['total_videos'] = p['videos']
+    stats['total_views'] = p['views']
+    stats['total_duration'] = p['duration']
+    stats['total_viewtime_days'] = truncate((p['viewtime'] / 60) / 24)
+    stats['total_viewtime_years'] = truncate(
+        stats['total_viewtime_days'] / 365)
+    stats['total_reactions'] = p['reactions']
+    stats['total_likes'] = p['likes']
+    stats['total_dislikes'] = p['dislikes']
+    stats['total_like_dislike_ratio'] = truncate(
+        p['likes'] / p['dislikes'].where(p['dislikes'] > 0))
+
+    stats['average_videos_per_day'] = truncate(p['videos'] / days)
+    stats['average_videos_per_week'] = truncate(p['videos'] / (days / 7))
+    stats['average_duration'] = truncate(p['duration'] / p['videos'])
+    stats['average_views_per_video'] = truncate(p['views'] / p['videos'])
+    stats['average_like_per_video'] = truncate(
+        p['likes'] / p['likes_count'].where(p['likes_count'] > 0))
+    stats['average_dislike_per_video'] = truncate(
+        p['dislikes'] / p['dislikes_count'].where(p['dislikes_count'] > 0))
+    stats['average_reactions_per_video'] = truncate(
+        p['reactions'] / p['reactions_count'].where(p['reactions_count'] > 0))
+
+    return stats
+
+
+def calculate_statistics(
+    df: pd.DataFrame,
+    by: str = 'channel'
+) -> pd.DataFrame:
+    """
+    Totals and averages of every channel in a single frame holding
+    them all, computed in one vectorized pass.
+    """
+    return finalize_statistics(channel_partials(df, by))
+
+
+def aggregate_statistics(store_path: str) -> pd.DataFrame:
+    """
+    Statistics of every channel from the sums kept by the aggregate
+    store (AGGREGATE_STORE_PATH), without reading any scrape.
+    """
+    with aggregate_store.AggregateStore(store_path) as store:
+        return finalize_statistics(store.partials())
+
+
+def chunked_partials(
+    names: List[str] = None,
+    chunksize: int = CHUNK_ROWS
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Channel partials, and partials per channel and upload month, of
+    every scrape in SCRAPES_PATH (or of the given channels). Scrapes
+    are wrangled and aggregated `chunksize` rows at a time and only
+    the running partials are kept, so memory doesn't grow with the
+    number or size of the scrapes.
+    """
+    channels, months = None, None
+    for name in names or discover_scrapes():
+        for chunk in read_scrape_chunks(name, chunksize, SCRAPE_COLUMNS):
+            chunk = get_channel_name(chunk, name)
+            chunk = basic_wrangling(chunk)
+            chunk = meta_function_feature_engineering(chunk)
+            chunk['month'] = chunk['upload_date'].dt.to_period('M')
+
+            chunk_channels = channel_partials(chunk)
+            chunk_months = channel_partials(chunk, ['channel', 'month'])
+            if channels is None:
+                channels, months = chunk_channels, chunk_months
+            else:
+                channels = merge_partials([channels, chunk_channels])
+                months = merge_partials([months, chunk_months])
+
+    return channels, months
+
+
 def prepare_ts_data(df: pd.DataFrame) -> Tuple:
     """Prepares a dataframe for monthly time series analysis."""
     df = create_time_components(df, 'upload_date')
@@ -400,9 +626,7 @@ def prepare_ts_data(df: pd.DataFrame) -> Tuple:
 
 def to_datetime_hs(data: pd.DataFrame, colname: str) -> pd.DataFrame:
     """Prepares a dataframe for monthly time series analysis."""
-    data[colname + "_dt"] = data[colname].apply(
-        lambda x: datetime.strptime(x, '%B %d, %Y'))
-    data[colname + "_dt"] = pd.to_datetime(data[colname + "_dt"])
+    data[colname + "_dt"] = pd.to_datetime(data[colname], format='%B %d, %Y')
 
     return data
 
@@ -437,95 +661,87 @@ def plot_vertical_lines(
 # %%
 # Testing functions
 # ============================#
-data_list = wrangle_all(CHANNEL_DICT)
-
-rarran, regis = data_list[0], data_list[1]
-channel_list = rarran, regis
-
-for channel in channel_list:
-    meta_function_feature_engineering(channel)
-
-for channel in channel_list:
-    meta_function_eda_plotting(channel)
-
-rarran_stats = meta_function_calculate_statistics(rarran)
-regis_stats = meta_function_calculate_statistics(regis)
-print(rarran_stats)
-print()
-print(regis_stats)
+if __name__ == "__main__":
+    # Plot one channel at a time, so only one scrape is in memory
+    for name in CHANNEL_NAMES:
+        channel = wrangle_all({name: read_scrape(name, SCRAPE_COLUMNS)})[0]
+        meta_function_feature_engineering(channel)
+        meta_function_eda_plotting(channel)
+        del channel
+
+    # Statistics of every channel, one row per channel, aggregated
+    # chunk by chunk instead of from whole scrapes
+    channel_totals, channel_months = chunked_partials(CHANNEL_NAMES)
+    statistics = finalize_statistics(channel_totals)
+    display(statistics.T)
 
 # %%
 # (WIP) Time series analysis
 # ============================#
-regis, regis_mon = prepare_ts_data(regis)
-rarran, rarran_mon = prepare_ts_data(rarran)
-
-plot_line(
-    df=regis_mon,
-    channel_name='Regis',
-    y_label='upload_date',
-    x_label='idx',
-    marker=True
-)
-
-plot_line(
-    df=rarran_mon,
-    channel_name='Rarran',
-    y_label='upload_date',
-    x_label='idx',
-    marker=True
-)
-
-# Data on Hearthstone key moments in history
-hs = pd.read_csv(
-    'data/external/hearthstone_content_dates.csv',
-    encoding='utf-8',
-    sep=';'
-    )
-
-# A small mistake on my side when
-# I saved this ^^
-hs = hs.drop(columns=[
-    'Unnamed: 5', 'Unnamed: 6',
-    'Unnamed: 7', 'Unnamed: 8'
-])
-
-hs = to_datetime_hs(hs, 'release_date')
-
-cols_to_drop = [
-    'release_date',
-    'removal_date',
-    'year'
-]
+if __name__ == "__main__":
+    # Videos uploaded per month, from the chunked monthly partials
+    for name in CHANNEL_NAMES:
+        mon = channel_months.loc[name, ['videos']]
+        mon['idx'] = [f'{month.month}-{month.year}' for month in mon.index]
+
+        plot_line(
+            df=mon,
+            channel_name=name.title(),
+            y_label='videos',
+            x_label='idx',
+            marker=True
+        )
+
+    # Data on Hearthstone key moments in history
+    hs = pd.read_csv(
+        'data/external/hearthstone_content_dates.csv',
+        encoding='utf-8',
+        sep=';'
+        )
 
-hs = hs.drop(columns=cols_to_drop)
-hs = hs.rename({'release_date_dt': 'release_date'}, axis=1)
-
-# Slice dataframe into different sets to explore
-core = hs[hs.release_type == 'Core']
-adventure = hs[hs.release_type == 'Adventure']
-expansion = hs[hs.release_type == 'Expansion']
-miniset = hs[hs.release_type == 'Miniset']
-
-# x coordinates for the lines
-x_core = np.array(core.release_date)
-x_adventure = np.array(adventure.release_date)
-x_expansion = np.array(expansion.release_date)
-x_miniset = np.array(miniset.release_date)
-
-name_core = np.array(core.set_name)
-name_adventure = np.array(adventure.set_name)
-name_expansion = np.array(expansion.set_name)
-name_miniset = np.array(miniset.set_name)
-
-date_core = np.array(core.release_date)
-date_adventure = np.array(adventure.release_date)
-date_expansion = np.array(expansion.release_date)
-date_miniset = np.array(miniset.release_date)
-
-xcoords = [x_core, x_adventure, x_expansion, x_miniset]
-names = [name_core, name_adventure, name_expansion, name_miniset]
-dates = [date_core, date_adventure, date_expansion, date_miniset]
-colors = ['darkgreen', 'red', 'blue', 'gold']
+    # A small mistake on my side when
+    # I saved this ^^
+    hs = hs.drop(columns=[
+        'Unnamed: 5', 'Unnamed: 6',
+        'Unnamed: 7', 'Unnamed: 8'
+    ])
+
+    hs = to_datetime_hs(hs, 'release_date')
+
+    cols_to_drop = [
+        'release_date',
+        'removal_date',
+        'year'
+    ]
+
+    hs = hs.drop(columns=cols_to_drop)
+    hs = hs.rename({'release_date_dt': 'release_date'}, axis=1)
+
+    # Slice dataframe into different sets to explore
+    core = hs[hs.release_type == 'Core']
+    adventure = hs[hs.release_type == 'Adventure']
+    expansion = hs[hs.release_type == 'Expansion']
+    miniset = hs[hs.release_type == 'Miniset']
+
+    # x coordinates for the lines
+    x_core = np.array(core.release_date)
+    x_adventure = np.array(adventure.release_date)
+    x_expansion = np.array(expansion.release_date)
+    x_miniset = np.array(miniset.release_date)
+
+    name_core = np.array(core.set_name)
+    name_adventure = np.array(adventure.set_name)
+    name_expansion = np.array(expansion.set_name)
+    name_miniset = np.array(miniset.set_name)
+
+    date_core = np.array(core.release_date)
+    date_adventure = np.array(adventure.release_date)
+    date_expansion = np.array(expansion.release_date)
+    date_miniset = np.array(miniset.release_date)
+
+    xcoords = [x_core, x_adventure, x_expansion, x_miniset]
+    names = [name_core, name_adventure, name_expansion, name_miniset]
+    dates = [date_core, date_adventure, date_expansion, date_miniset]
+    colors = ['darkgreen', 'red', 'blue', 'gold']
 
 # %%
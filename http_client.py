@@ -0,0 +1,177 @@
+"""
+Shared HTTP client used by the scrapers.
+Connections are pooled and kept alive per host and responses are
+transferred compressed (gzip/deflate, brotli when available), so long
+runs don't pay a fresh TCP+TLS handshake and a full-size download
+for every page.
+"""
+import json
+import threading
+import time
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util import make_headers
+from typing import Dict
+import metrics
+
+
+# Options read from the scrapers' configuration files
+DEFAULT_OPTIONS = {
+    'HTTP_CONNECT_TIMEOUT': 5.0,
+    'HTTP_READ_TIMEOUT': 30.0,
+    'HTTP_NUM_POOLS': 10,
+    'HTTP_POOL_MAXSIZE': 10
+}
+
+DEFAULT_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/91.0.4472.77 Safari/537.36'
+    ),
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+
+class HttpError(Exception):
+    """Raised when a request comes back with an error status."""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """Connection that records how long DNS and connecting took."""
+
+    def connect(self) -> None:
+        with metrics.timer('connect'):
+            super().connect()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """Connection that records how long DNS, connecting and TLS took."""
+
+    def connect(self) -> None:
+        with metrics.timer('connect'):
+            super().connect()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class HttpClient:
+    """Thread-safe HTTP client with per-host keep-alive connection pools."""
+
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_OPTIONS['HTTP_CONNECT_TIMEOUT'],
+        read_timeout: float = DEFAULT_OPTIONS['HTTP_READ_TIMEOUT'],
+        num_pools: int = DEFAULT_OPTIONS['HTTP_NUM_POOLS'],
+        pool_maxsize: int = DEFAULT_OPTIONS['HTTP_POOL_MAXSIZE'],
+        headers: Dict = None
+    ):
+        request_headers = make_headers(accept_encoding=True)
+        request_headers.update(DEFAULT_HEADERS)
+        request_headers.update(headers or {})
+
+        self.pool = urllib3.PoolManager(
+            num_pools=num_pools,
+            maxsize=pool_maxsize,
+            headers=request_headers,
+            timeout=urllib3.Timeout(
+                connect=connect_timeout, read=read_timeout),
+            retries=False
+        )
+        self.pool.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool
+        }
+
+    def request(self, method: str, url: str, **kwargs) -> bytes:
+        """Send a request, counting its time, status and size."""
+        start = time.perf_counter()
+        try:
+            response = self.pool.request(
+                method, url, decode_content=True, **kwargs)
+        except Exception as e:
+            metrics.inc('http_errors_total', error=type(e).__name__)
+            raise
+        finally:
+            metrics.observe(
+                'http_request_seconds', time.perf_counter() - start,
+                method=method)
+        metrics.inc('http_responses_total', status=response.status)
+        metrics.inc('http_bytes_total', len(response.data))
+        if response.status >= 400:
+            raise HttpError(url, response.status)
+
+        return response.data
+
+    def get(self, url: str) -> bytes:
+        """Fetch the URL and return the decompressed body."""
+        return self.request('GET', url)
+
+    def post(self, url: str, body: bytes, content_type: str) -> bytes:
+        """POST a body to the URL and return the decompressed response."""
+        return self.request(
+            'POST', url,
+            body=body,
+            headers=dict(self.pool.headers, **{'Content-Type': content_type}))
+
+    def post_json(self, url: str, payload: Dict) -> Dict:
+        """POST a JSON payload and return the decoded JSON response."""
+        return json.loads(self.post(
+            url, json.dumps(payload).encode('utf-8'), 'application/json'))
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        self.pool.clear()
+
+
+# MODULE LEVEL CLIENT
+# ============================ #
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure(options: Dict) -> HttpClient:
+    """Build the shared client from a scraper configuration dict."""
+    options = dict(DEFAULT_OPTIONS, **options)
+    client = HttpClient(
+        connect_timeout=options['HTTP_CONNECT_TIMEOUT'],
+        read_timeout=options['HTTP_READ_TIMEOUT'],
+        num_pools=options['HTTP_NUM_POOLS'],
+        pool_maxsize=options['HTTP_POOL_MAXSIZE']
+    )
+    set_client(client)
+
+    return client
+
+
+def set_client(client: HttpClient) -> None:
+    """Replace the shared client, closing the previous one."""
+    global _client
+
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
+
+
+def get_client() -> HttpClient:
+    """Return the shared client, creating one with defaults if needed."""
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+
+        return _client
@@ -0,0 +1,331 @@
+"""
+SQLite store of the video links harvested from channels.
+Every video is kept once, keyed by its ID, with the channel it was
+found on, when it was first seen and when it was last scraped, so
+deduplication and picking what to scrape next are indexed queries
+instead of scans over the .list files in data/links/.
+
+Usage (importing the .list files of earlier runs):
+    python link_store.py data/links/links.db data/links/*.list
+"""
+import argparse
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_scraped TEXT,
+    upload_date TEXT,
+    views INTEGER,
+    views_per_day REAL,
+    last_attempted TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    failed_permanently INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS videos_channel ON videos (channel_id);
+CREATE INDEX IF NOT EXISTS videos_last_scraped ON videos (last_scraped);
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id TEXT PRIMARY KEY,
+    complete INTEGER NOT NULL DEFAULT 0,
+    last_harvested TEXT
+);
+"""
+
+# Columns added after the first version of the schema
+ADDED_COLUMNS = {
+    'upload_date': 'TEXT',
+    'views': 'INTEGER',
+    'views_per_day': 'REAL',
+    'last_attempted': 'TEXT',
+    'failures': 'INTEGER NOT NULL DEFAULT 0',
+    'failed_permanently': 'INTEGER NOT NULL DEFAULT 0'
+}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Days before a video whose last scrape failed is tried again, doubled
+# for every further run it failed in (up to 2 ** 10 times)
+RETRY_FAILED_AFTER_DAYS = 1
+
+# Videos left out of the pending and refresh queues: removed or private
+# ones (failed with a permanent error), and ones still backing off
+# after failing in recent runs
+SKIPPED = """
+failed_permanently = 1 OR (
+    failures > 0 AND julianday(:now) - julianday(last_attempted)
+        < :retry_days * (1 << min(failures - 1, 10)))
+"""
+
+# How overdue a video is for a refresh: the days since it was last
+# scraped times the views it gains a day (plus one, so that quiet
+# videos still come up once they are stale enough). Videos never
+# scraped come first.
+PRIORITY = """
+CASE WHEN last_scraped IS NULL THEN 1e300 ELSE
+    (julianday(:now) - julianday(last_scraped))
+    * (1 + coalesce(views_per_day, 0))
+END
+"""
+
+# Views gained a day since the last scrape; on the first scrape, the
+# average since the upload
+GROWTH = """
+CASE
+    WHEN :views IS NULL THEN views_per_day
+    WHEN views IS NOT NULL AND julianday(:now) > julianday(last_scraped)
+        THEN max(0, (:views - views)
+                 / (julianday(:now) - julianday(last_scraped)))
+    WHEN coalesce(:upload_date, upload_date) IS NOT NULL
+        THEN :views / max(1, julianday(:now)
+                          - julianday(coalesce(:upload_date, upload_date)))
+    ELSE views_per_day
+END
+"""
+
+
+def now() -> str:
+    """The current time, as stored in the timestamp columns."""
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+class LinkStore:
+    """Links to videos, one row per video."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by the channel scraper's threads, one call at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # WAL lets a video scraper read while a channel scraper writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self._add_columns()
+
+    def _add_columns(self) -> None:
+        """Bring a store made with an older schema up to date."""
+        columns = {
+            row[1] for row in
+            self.connection.execute('PRAGMA table_info(videos)')}
+        with self.connection:
+            for name, kind in ADDED_COLUMNS.items():
+                if name not in columns:
+                    self.connection.execute(
+                        f'ALTER TABLE videos ADD COLUMN {name} {kind}')
+
+    def add_links(self, channel_id: str, links: Iterable[str]) -> int:
+        """
+        Add the links found on a channel in one transaction, ignoring
+        videos already stored. Returns how many were new.
+        """
+        # Imported here since video_scraper imports this module
+        from video_scraper import video_id_from_url
+
+        seen = now()
+        rows = [
+            (video_id_from_url(link), channel_id, link, seen)
+            for link in links if link
+        ]
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO videos '
+                '(video_id, channel_id, url, first_seen) VALUES (?, ?, ?, ?)',
+                [row for row in rows if row[0] is not None])
+
+            return self.connection.total_changes - before
+
+    def query(self, sql: str, params=()) -> List[tuple]:
+        """Run a read query and fetch all of its rows."""
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def mark_harvested(self, channel_id: str, complete: bool) -> None:
+        """
+        Record a harvest of the channel. Once a harvest has listed the
+        channel to its end, the channel stays complete.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO channels (channel_id, complete, last_harvested) '
+                'VALUES (?, ?, ?) ON CONFLICT (channel_id) DO UPDATE SET '
+                'complete = max(complete, excluded.complete), '
+                'last_harvested = excluded.last_harvested',
+                (channel_id, int(complete), now()))
+
+    def is_complete(self, channel_id: str) -> bool:
+        """Whether the channel's whole history is in the store."""
+        rows = self.query(
+            'SELECT complete FROM channels WHERE channel_id = ?',
+            (channel_id,))
+
+        return bool(rows and rows[0][0])
+
+    def known_ids(self, channel_id: str) -> Set[str]:
+        """IDs of the videos stored for a channel."""
+        return {video_id for video_id, in self.query(
+            'SELECT video_id FROM videos WHERE channel_id = ?', (channel_id,))}
+
+    def channel_links(self, channel_id: str) -> List[str]:
+        """Links to a channel's videos, the latest found first."""
+        return [url for url, in self.query(
+            'SELECT url FROM videos WHERE channel_id = ? '
+            'ORDER BY first_seen DESC, rowid', (channel_id,))]
+
+    def pending(
+        self,
+        channel_id: str = None,
+        stale_after_days: float = None
+    ) -> List[str]:
+        """
+        Links to the videos never scraped, and to those last scraped
+        more than `stale_after_days` ago when given.
+        """
+        where = ['last_scraped IS NULL']
+        params = {'now': now(), 'retry_days': RETRY_FAILED_AFTER_DAYS}
+        if stale_after_days is not None:
+            where.append('last_scraped < :cutoff')
+            cutoff = datetime.now() - timedelta(days=stale_after_days)
+            params['cutoff'] = cutoff.strftime(TIMESTAMP_FORMAT)
+        query = (f"SELECT url FROM videos WHERE ({' OR '.join(where)}) "
+                 f"AND NOT ({SKIPPED})")
+        if channel_id is not None:
+            query += ' AND channel_id = :channel_id'
+            params['channel_id'] = channel_id
+        return [url for url, in self.query(query + ' ORDER BY rowid', params)]
+
+    def stale(self, older_than_days: float, channel_id: str = None) -> List:
+        """Links to the videos last scraped more than the given days ago."""
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        query = 'SELECT url FROM videos WHERE last_scraped < ?'
+        params = [cutoff.strftime(TIMESTAMP_FORMAT)]
+        if channel_id is not None:
+            query += ' AND channel_id = ?'
+            params.append(channel_id)
+        return [url for url, in self.query(
+            query + ' ORDER BY last_scraped', params)]
+
+    def mark_scraped(self, video_ids: Iterable[str], when: str = None) -> None:
+        """Set the last scraped time of the videos in one transaction."""
+        when = when or now()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'UPDATE videos SET last_scraped = ? WHERE video_id = ?',
+                [(when, video_id) for video_id in video_ids])
+
+    def record_scrapes(
+        self,
+        records: Iterable[Dict],
+        when: str = None
+    ) -> None:
+        """
+        Mark scraped records' videos in one transaction, keeping their
+        views and how fast the views grew since the previous scrape.
+        Earlier failures of the videos are forgotten.
+        """
+        when = when or now()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f'UPDATE videos SET views_per_day = ({GROWTH}), '
+                'views = coalesce(:views, views), '
+                'upload_date = coalesce(:upload_date, upload_date), '
+                'last_scraped = :now, last_attempted = :now, '
+                'failures = 0, failed_permanently = 0 '
+                'WHERE video_id = :video_id',
+                [{
+                    'video_id': record['video_id'],
+                    'views': record.get('views'),
+                    'upload_date': record.get('upload_date'),
+                    'now': when
+                } for record in records])
+
+    def record_failures(
+        self,
+        failures: Iterable[Tuple[str, bool]],
+        when: str = None
+    ) -> None:
+        """
+        Record the (video ID, permanent) failures of a run in one
+        transaction, so the queues skip removed videos and back off
+        from failing ones.
+        """
+        when = when or now()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'UPDATE videos SET last_attempted = ?, '
+                'failures = failures + 1, '
+                'failed_permanently = max(failed_permanently, ?) '
+                'WHERE video_id = ?',
+                [(when, int(permanent), video_id)
+                 for video_id, permanent in failures])
+
+    def refresh_queue(self, budget: int, channel_id: str = None) -> List[str]:
+        """
+        Links to the `budget` videos most worth scraping again: never
+        scraped ones first, then by PRIORITY, leaving out the SKIPPED
+        ones. The budget counts videos; retries of a failing video
+        within a run come on top of it.
+        """
+        query = f'SELECT url FROM videos WHERE NOT ({SKIPPED})'
+        params = {
+            'now': now(),
+            'budget': budget,
+            'retry_days': RETRY_FAILED_AFTER_DAYS
+        }
+        if channel_id is not None:
+            query += ' AND channel_id = :channel_id'
+            params['channel_id'] = channel_id
+        query += f' ORDER BY ({PRIORITY}) DESC, rowid LIMIT :budget'
+
+        return [url for url, in self.query(query, params)]
+
+    def import_list(self, path: str, channel_id: str = None) -> int:
+        """
+        Add the links of a .list file. The channel defaults to the part
+        of the file name before the timestamp, e.g. Rarran-202106052026.
+        """
+        if channel_id is None:
+            channel_id = os.path.splitext(os.path.basename(path))[0]
+            head, _, stamp = channel_id.rpartition('-')
+            if head and stamp.isdigit():
+                channel_id = head
+        with open(path) as f:
+            links = [line.strip() for line in f if line.strip()]
+
+        return self.add_links(channel_id, links)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('store', help='path of the SQLite link store')
+    parser.add_argument('lists', nargs='+', help='.list files to import')
+    parser.add_argument(
+        '--channel', help='channel ID, instead of the one in file names')
+    args = parser.parse_args()
+
+    with LinkStore(args.store) as store:
+        for path in args.lists:
+            added = store.import_list(path, args.channel)
+            print(f"{path}: {added:,} new links")
@@ -0,0 +1,274 @@
+"""
+Counters, gauges and latency histograms of a scrape run.
+Every stage (connect, fetch, parse, extract, write, harvest) records
+how long it took, along with bytes downloaded, retries, errors by
+class and queue depths. The numbers are served in the Prometheus text
+format on METRICS_PORT and/or written every METRICS_SNAPSHOT_EVERY
+seconds as a JSON snapshot to METRICS_SNAPSHOT_PATH.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+
+# Options read from the scrapers' configuration files
+DEFAULT_OPTIONS = {
+    'METRICS_PORT': None,
+    'METRICS_SNAPSHOT_PATH': None,
+    'METRICS_SNAPSHOT_EVERY': 10
+}
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+PREFIX = 'scraper_'
+
+
+def label_key(labels: Dict) -> Tuple:
+    """Labels in a hashable, stable order."""
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """A thread-safe registry of counters, gauges and histograms."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.histograms = {}
+
+    def reset(self) -> None:
+        """
+        Start from an empty registry, e.g. in a forked worker process
+        that inherited its parent's numbers.
+        """
+        self.lock = threading.Lock()
+        self.counters, self.gauges, self.histograms = {}, {}, {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Add to a counter."""
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels) -> None:
+        """Set a gauge, such as a queue depth."""
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Count a duration in its histogram bucket."""
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Time a block as one run of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                'stage_seconds', time.perf_counter() - start,
+                stage=stage, **labels)
+
+    def drain(self) -> Dict:
+        """
+        Take the counters and histograms recorded so far, leaving the
+        registry empty. Used to send a worker process' numbers back.
+        """
+        with self.lock:
+            state = {
+                'counters': self.counters,
+                'histograms': self.histograms
+            }
+            self.counters, self.histograms = {}, {}
+
+        return state
+
+    def merge(self, state: Dict) -> None:
+        """Add the numbers drained from another registry."""
+        with self.lock:
+            for key, value in state['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, counts in state['histograms'].items():
+                histogram = self.histograms.setdefault(
+                    key, [0] * len(counts))
+                for i, count in enumerate(counts):
+                    histogram[i] += count
+
+    def snapshot(self) -> Dict:
+        """Everything recorded so far, as a JSON-friendly dict."""
+        def row(name, labels, **values):
+            return dict(name=name, labels=dict(labels), **values)
+
+        with self.lock:
+            return {
+                'time': time.time(),
+                'uptime_seconds': time.time() - self.started,
+                'counters': [
+                    row(name, labels, value=value)
+                    for (name, labels), value in self.counters.items()],
+                'gauges': [
+                    row(name, labels, value=value)
+                    for (name, labels), value in self.gauges.items()],
+                'histograms': [
+                    row(name, labels,
+                        buckets=dict(zip(BUCKETS + ('+Inf',), counts[:-1])),
+                        count=sum(counts[:-1]), sum=counts[-1])
+                    for (name, labels), counts in self.histograms.items()]
+            }
+
+    def prometheus(self) -> str:
+        """Everything recorded so far, in the Prometheus text format."""
+        def labelled(name, labels, **extra):
+            labels = dict(labels, **extra)
+            if not labels:
+                return PREFIX + name
+            pairs = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            return f'{PREFIX}{name}{{{pairs}}}'
+
+        lines = []
+        typed = set()
+        with self.lock:
+            for kind, series in (('counter', self.counters),
+                                 ('gauge', self.gauges)):
+                for (name, labels), value in sorted(series.items()):
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+                    lines.append(f'{labelled(name, labels)} {value}')
+            for (name, labels), counts in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {PREFIX}{name} histogram')
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), counts[:-1]):
+                    cumulative += count
+                    lines.append(
+                        f'{labelled(name + "_bucket", labels, le=bound)} '
+                        f'{cumulative}')
+                lines.append(f'{labelled(name + "_sum", labels)} {counts[-1]}')
+                lines.append(
+                    f'{labelled(name + "_count", labels)} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# MODULE LEVEL REGISTRY
+# ============================ #
+registry = Metrics()
+inc = registry.inc
+gauge = registry.gauge
+observe = registry.observe
+timer = registry.timer
+reset = registry.reset
+
+
+def reset_registry() -> None:
+    """
+    Empty the module level registry. A plain function, unlike the bound
+    method `reset`, can be pickled as a spawned process pool's initializer.
+    """
+    registry.reset()
+
+
+# EXPORTING
+# ============================ #
+
+class Exporter:
+    """Serve the registry over HTTP and/or write it to a JSON file."""
+
+    def __init__(
+        self,
+        port: int = None,
+        snapshot_path: str = None,
+        snapshot_every: float = 10
+    ):
+        self.server = None
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.stopped = threading.Event()
+        self.writer = None
+
+        if port is not None:
+            self.server = ThreadingHTTPServer(('', port), MetricsHandler)
+            self.server.daemon_threads = True
+            threading.Thread(
+                target=self.server.serve_forever, daemon=True).start()
+            print(f"Serving metrics on http://localhost:{port}/metrics")
+        if snapshot_path:
+            self.writer = threading.Thread(
+                target=self._write_snapshots, daemon=True)
+            self.writer.start()
+
+    def write_snapshot(self) -> None:
+        """Replace the snapshot file with the current numbers."""
+        temporary = self.snapshot_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(temporary, self.snapshot_path)
+
+    def _write_snapshots(self) -> None:
+        while not self.stopped.wait(self.snapshot_every):
+            self.write_snapshot()
+
+    def close(self) -> None:
+        """Stop serving and write a last snapshot."""
+        self.stopped.set()
+        if self.writer is not None:
+            self.writer.join()
+            self.write_snapshot()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answer GET /metrics with the registry in Prometheus format."""
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def from_options(options: Dict) -> Exporter:
+    """Start exporting as set in a scraper configuration dict."""
+    options = dict(DEFAULT_OPTIONS, **options)
+
+    return Exporter(
+        options['METRICS_PORT'],
+        options['METRICS_SNAPSHOT_PATH'],
+        options['METRICS_SNAPSHOT_EVERY'])
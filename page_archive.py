@@ -0,0 +1,295 @@
+"""
+Append-only archive of the raw video pages fetched by the scrapers.
+Every page is compressed on its own (zstd when the zstandard package
+is installed, zlib otherwise) and appended to the current segment
+file, and a SQLite index maps its video ID to (segment, offset,
+length). Pages can then be parsed again with a newer extractor
+without touching the network.
+
+Usage (re-extracting every archived page into a JSON Lines file):
+    python page_archive.py reprocess data/archive data/scrapes/all.jsonl
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
+from tqdm import tqdm
+import link_store
+import writers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+INDEX = """
+CREATE TABLE IF NOT EXISTS pages (
+    video_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    archived_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_segment ON pages (segment, offset);
+"""
+
+# Options read from the video scraper's configuration file
+DEFAULT_OPTIONS = {
+    'ARCHIVE_DIR': None,
+    'ARCHIVE_SEGMENT_MB': 256,
+    'ARCHIVE_LEVEL': 3
+}
+
+# Index rows written between two commits
+COMMIT_EVERY = 100
+
+# Pages handed to a reprocessing worker at a time
+REPROCESS_BATCH = 256
+
+
+# DEFINE HELPER FUNCTIONS
+# ============================ #
+
+def compress(html: bytes, level: int) -> Tuple[bytes, str]:
+    """Compress one page, returning the bytes and the codec used."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(html), 'zstd'
+
+    return zlib.compress(html, min(level, 9)), 'zlib'
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """Undo `compress` for a page stored with the given codec."""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to read "
+                               "pages archived with zstd")
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return zlib.decompress(data)
+
+
+class PageArchive:
+    """Raw pages in append-only segment files, indexed by video ID."""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_mb: float = 256,
+        level: int = 3
+    ):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.segment_bytes = int(segment_mb * 1024 * 1024)
+        self.level = level
+        self.lock = threading.Lock()
+        self.index = sqlite3.connect(
+            os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.index.execute('PRAGMA journal_mode=WAL')
+        self.index.executescript(INDEX)
+        self.uncommitted = 0
+        self.segment = None
+        self.file = None
+
+    def _segment_file(self):
+        """The segment to append to, starting a new one when it's full."""
+        if self.file is not None and self.file.tell() < self.segment_bytes:
+            return self.file
+
+        # A new run carries on with the last segment if it has room
+        carry_on = self.file is None
+        if self.file is not None:
+            self.file.close()
+        segments = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith('segment-'))
+        if carry_on and segments and os.path.getsize(os.path.join(
+                self.directory, segments[-1])) < self.segment_bytes:
+            self.segment = segments[-1]
+        else:
+            self.segment = f'segment-{len(segments):05d}.pages'
+        self.file = open(os.path.join(self.directory, self.segment), 'ab')
+
+        return self.file
+
+    def append(self, video_id: str, url: str, html: bytes) -> None:
+        """Archive a page. A page archived again replaces the older one."""
+        data, codec = compress(html, self.level)
+        with self.lock:
+            f = self._segment_file()
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            self.index.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (video_id, url, self.segment, offset, len(data), codec,
+                 link_store.now()))
+            self.uncommitted += 1
+            if self.uncommitted >= COMMIT_EVERY:
+                self._commit()
+
+    def _commit(self) -> None:
+        # The pages must be on disk before the index points at them
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.index.commit()
+        self.uncommitted = 0
+
+    def read(self, video_id: str) -> bytes:
+        """The latest archived page of a video."""
+        with self.lock:
+            row = self.index.execute(
+                'SELECT segment, offset, length, codec FROM pages '
+                'WHERE video_id = ?', (video_id,)).fetchone()
+            if self.file is not None:
+                self.file.flush()
+        if row is None:
+            raise KeyError(video_id)
+
+        return read_page(self.directory, *row)
+
+    def entries(self) -> List[tuple]:
+        """Index rows of every archived page, in storage order."""
+        with self.lock:
+            return self.index.execute(
+                'SELECT video_id, url, segment, offset, length, codec, '
+                'archived_at FROM pages ORDER BY segment, offset').fetchall()
+
+    def close(self) -> None:
+        """Flush the current segment and commit the index."""
+        with self.lock:
+            if self.file is not None:
+                self._commit()
+                self.file.close()
+                self.file = None
+            self.index.commit()
+            self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def from_options(options: Dict) -> PageArchive:
+    """Open the archive at ARCHIVE_DIR, or return None when it's unset."""
+    options = dict(DEFAULT_OPTIONS, **options)
+    if not options['ARCHIVE_DIR']:
+        return None
+
+    return PageArchive(
+        options['ARCHIVE_DIR'],
+        options['ARCHIVE_SEGMENT_MB'],
+        options['ARCHIVE_LEVEL'])
+
+
+def read_page(
+    directory: str,
+    segment: str,
+    offset: int,
+    length: int,
+    codec: str
+) -> bytes:
+    """Read one page straight from its segment file."""
+    with open(os.path.join(directory, segment), 'rb') as f:
+        f.seek(offset)
+        return decompress(f.read(length), codec)
+
+
+def reprocess_batch(
+    directory: str,
+    entries: List[tuple],
+    parser: str
+) -> Tuple[List[Dict], List[Tuple[str, str]]]:
+    """
+    Parse a batch of archived pages of one segment (runs in a worker
+    process). Returns the records and the (video ID, error) failures.
+    """
+    # Imported here since video_scraper imports this module
+    import video_scraper
+
+    records, failures = [], []
+    with open(os.path.join(directory, entries[0][2]), 'rb') as f:
+        for video_id, url, _, offset, length, codec, archived_at in entries:
+            f.seek(offset)
+            try:
+                html = decompress(f.read(length), codec)
+                records.append(video_scraper.parse_video_page(
+                    url, html, parser, archived_at[:10]))
+            except Exception as e:
+                failures.append((video_id, f"{type(e).__name__}: {e}"))
+
+    return records, failures
+
+
+def batches(entries: List[tuple], size: int) -> Iterator[List[tuple]]:
+    """Split index rows into batches that each stay within one segment."""
+    by_segment = defaultdict(list)
+    for entry in entries:
+        by_segment[entry[2]].append(entry)
+    for segment_entries in by_segment.values():
+        for start in range(0, len(segment_entries), size):
+            yield segment_entries[start:start + size]
+
+
+def reprocess(
+    directory: str,
+    output_path: str,
+    parser: str = 'fast',
+    workers: int = None
+) -> int:
+    """
+    Re-extract every archived page across `workers` processes and
+    write the records to a JSON Lines file. Each record keeps the date
+    its page was fetched as its scrape date. Returns the record count.
+    """
+    with PageArchive(directory) as archive:
+        entries = archive.entries()
+    print(f"Reprocessing {len(entries):,} archived pages.")
+
+    written = 0
+    progress = tqdm(total=len(entries))
+    with writers.JsonlWriter(output_path, flush_every=1000) as writer, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(reprocess_batch, directory, batch, parser)
+            for batch in batches(entries, REPROCESS_BATCH)
+        ]
+        for future in as_completed(futures):
+            records, failures = future.result()
+            for record in records:
+                writer.write(record)
+            for video_id, error in failures:
+                print(f"*\nCouldn't reprocess {video_id}: {error}")
+            written += len(records)
+            progress.update(len(records) + len(failures))
+    progress.close()
+
+    return written
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser(
+        'reprocess', help='parse the archived pages again, offline')
+    command.add_argument('archive', help='directory of the archive')
+    command.add_argument('output', help='JSON Lines file to write')
+    command.add_argument('--parser', default='fast',
+                         choices=['fast', 'full', 'compare'])
+    command.add_argument('--workers', type=int, default=os.cpu_count(),
+                         help='parsing processes')
+    args = parser.parse_args()
+
+    if args.command == 'reprocess':
+        count = reprocess(args.archive, args.output, args.parser, args.workers)
+        print(f"\n{count:,} records written to {args.output}")
@@ -0,0 +1,181 @@
+# %%
+"""
+Harvest channels and scrape their videos in one run.
+Video URLs go into the scraping queue as soon as the channel scraper
+finds them, so video pages are fetched and parsed while the channels
+are still being listed, instead of waiting for a finished .list.
+The settings come from the two scrapers' configuration files, named
+in config/pipeline_config.json.
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Set
+from tqdm import tqdm
+import browser_pool
+import channel_scraper
+import http_client
+import link_store
+import metrics
+import page_archive
+import rate_limiter
+import retries
+import video_scraper
+import writers
+
+
+# DEFINE HELPER FUNCTIONS
+# ============================ #
+
+def harvest_into(
+    feed: retries.UrlFeed,
+    channel_urls: List[str],
+    channel_options: Dict,
+    store: link_store.LinkStore
+) -> None:
+    """
+    Harvest the channels in parallel (like channel_scraper.py), putting
+    their links on the feed as they are found. Runs in its own thread
+    and closes the feed when done.
+    """
+    limiter = rate_limiter.from_options(channel_options)
+    pool = browser_pool.from_options(channel_options)
+    try:
+        with pool, ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = {
+                executor.submit(
+                    channel_scraper.harvest_channel, url, store, limiter,
+                    pool, channel_options.get("ENUMERATOR", "http"),
+                    channel_options.get("INCREMENTAL", False), feed.put): url
+                for url in channel_urls
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"*\nFailed to harvest {futures[future]} "
+                          f"({type(e).__name__}: {e}).")
+                    continue
+                print(f"\n{result['channel_id']}: found {result['found']} "
+                      f"links, {result['new']} of them new.")
+    finally:
+        feed.close()
+
+
+async def harvest_and_scrape(
+    channel_urls: List[str],
+    channel_options: Dict,
+    video_options: Dict,
+    store: link_store.LinkStore,
+    on_record: Callable,
+    on_failure: Callable,
+    skip_ids: Set[str] = None
+) -> None:
+    """
+    Run the channel harvest in a background thread and stream what it
+    finds through the video scraper's fetch/parse pipeline.
+    """
+    skip_ids = skip_ids or set()
+    feed = retries.UrlFeed(
+        skip=lambda url: video_scraper.video_id_from_url(url) in skip_ids)
+    harvester = threading.Thread(
+        target=harvest_into,
+        args=(feed, channel_urls, channel_options, store),
+        daemon=True)
+    harvester.start()
+    archive = page_archive.from_options(video_options)
+    try:
+        await video_scraper.run_pipeline(
+            feed, video_options, on_record, on_failure, archive)
+    finally:
+        if archive is not None:
+            archive.close()
+    harvester.join()
+
+
+# THE MAIN METHOD
+# ============================ #
+if __name__ == "__main__":
+    runtime_start = time.time()
+    current_date = datetime.today().strftime('%Y-%m-%d')
+
+    # Unpack the configuration options
+    # -------------------------------------- #
+    config_path = "config/pipeline_config.json"
+    config_options = channel_scraper.load_configuration_file(config_path)
+    if config_options is False:
+        print("\nMissing, empty or wrongly named config file. \
+            Program will terminate.")
+        sys.exit()
+
+    channel_options = channel_scraper.load_configuration_file(
+        config_options["CHANNEL_CONFIG"])
+    video_options = channel_scraper.load_configuration_file(
+        config_options["VIDEO_CONFIG"])
+    if channel_options is False or video_options is False:
+        print("\nMissing scraper config file. Program will terminate.")
+        sys.exit()
+
+    channel_urls = channel_options.get("INPUT_PATHS") or [
+        channel_options["INPUT_PATH"]]
+    output_path = video_options["OUTPUT_PATH"]
+    store_path = channel_options.get("LINK_STORE_PATH", "data/links/links.db")
+    video_options = dict(video_scraper.PIPELINE_DEFAULTS, **video_options)
+    video_options["SCRAPE_DATE"] = current_date
+    http_client.configure(video_options)
+    print(f"\nScraping {len(channel_urls)} channel(s) into {output_path}")
+
+    # Harvest and scrape at the same time
+    # -------------------------------------- #
+    output_format = video_options.get("OUTPUT_FORMAT", "json")
+    resume = output_format == "jsonl" and video_options.get("RESUME", False)
+    skip_ids = writers.done_video_ids(output_path) if resume else None
+    scraped_videos_list = []
+    writer = None
+    if output_format == "jsonl":
+        writer = writers.JsonlWriter(
+            output_path,
+            append=resume,
+            flush_every=video_options.get("FLUSH_EVERY", 10))
+        write_record = writer.write
+    elif output_format == "parquet":
+        writer = writers.ParquetWriter(output_path)
+        write_record = writer.write
+    else:
+        write_record = scraped_videos_list.append
+
+    store = link_store.LinkStore(store_path)
+    progress = tqdm(unit=' videos')
+    exporter = metrics.from_options(video_options)
+
+    def on_record(record: Dict) -> None:
+        write_record(record)
+        progress.update()
+
+    try:
+        with video_scraper.record_hooks(video_options, on_record, store) as (
+                on_record, on_failure):
+            asyncio.run(harvest_and_scrape(
+                channel_urls, channel_options, video_options, store,
+                on_record, on_failure, skip_ids))
+    finally:
+        progress.close()
+        store.close()
+        exporter.close()
+        if writer is not None:
+            writer.close()
+
+    # Save the results in a JSON file
+    # -------------------------------------- #
+    if writer is None:
+        with open(output_path, 'w') as f:
+            json.dump(scraped_videos_list, f)
+
+    # Keeping track of runtime.
+    # -------------------------------------- #
+    runtime_end = time.time()
+    print(f"\nScript done in {round(runtime_end-runtime_start,2):,}s")
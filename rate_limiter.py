@@ -0,0 +1,203 @@
+"""
+Rate limiting for the scrapers.
+Requests are paced per host with a token bucket plus a little random
+jitter, and the number of requests in flight is adapted AIMD-style:
+it grows by one while responses are fast and healthy, and is halved
+when latency climbs over the target or the host answers 429/503.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from urllib.parse import urlparse
+
+
+# Options read from the scrapers' configuration files
+DEFAULT_OPTIONS = {
+    'RATE_PER_SECOND': 2.0,
+    'BURST': 4,
+    'JITTER': 0.5,
+    'CONCURRENCY': 1,
+    'MIN_CONCURRENCY': 1,
+    'TARGET_LATENCY': 2.0,
+    'THROTTLE_PAUSE': 5.0
+}
+
+# Statuses that mean the host wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every token for the next `seconds`."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class RateLimiter:
+    """Per-host token buckets with random jitter on every wait."""
+
+    def __init__(self, rate: float, burst: int, jitter: float = 0):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """Return the bucket of the URL's host."""
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+
+            return self.buckets[host]
+
+    def delay(self, url: str) -> float:
+        """Reserve a request to the URL's host and return the wait."""
+        return self.bucket(url).reserve() + random.uniform(0, self.jitter)
+
+    def wait(self, url: str) -> None:
+        """Block until a request to the URL's host is allowed."""
+        time.sleep(self.delay(url))
+
+    async def acquire(self, url: str) -> None:
+        """Wait, without blocking the event loop, for the URL's host."""
+        await asyncio.sleep(self.delay(url))
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit adjusted with additive increase / multiplicative
+    decrease from observed latencies and response statuses.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float
+    ):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.active = 0
+        self.successes = 0
+        self.last_decrease = 0.0
+        self.condition = None
+        self.lock = threading.Lock()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the currently allowed request slots."""
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def record(self, latency: float, status: int) -> bool:
+        """
+        Adjust the limit after a response and return True when it was
+        throttled. Decreases happen at most once per target latency so a
+        burst of slow responses doesn't collapse the limit to the minimum.
+        """
+        throttled = status in THROTTLE_STATUSES
+        with self.lock:
+            if throttled or latency > self.target_latency:
+                now = time.monotonic()
+                if now - self.last_decrease > self.target_latency:
+                    self.limit = max(self.minimum, self.limit // 2)
+                    self.last_decrease = now
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.limit:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self.successes = 0
+
+        return throttled
+
+
+class AdaptiveLimiter:
+    """Token bucket pacing combined with an adaptive concurrency limit."""
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+        concurrency: AdaptiveConcurrency,
+        throttle_pause: float
+    ):
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.throttle_pause = throttle_pause
+
+    @asynccontextmanager
+    async def request(self, url: str):
+        """Wait for a slot and for the host's pacing before a request."""
+        async with self.concurrency.slot():
+            await self.rate_limiter.acquire(url)
+            yield
+
+    def wait(self, url: str) -> None:
+        """Block until a request to the URL's host is allowed."""
+        self.rate_limiter.wait(url)
+
+    def record(self, url: str, latency: float, status: int) -> None:
+        """Feed a response back, backing the host off when throttled."""
+        if self.concurrency.record(latency, status):
+            self.rate_limiter.bucket(url).pause(self.throttle_pause)
+
+
+def from_options(options: Dict) -> AdaptiveLimiter:
+    """Build a limiter from a scraper configuration dict."""
+    options = dict(DEFAULT_OPTIONS, **options)
+    maximum = max(options['CONCURRENCY'], options['MIN_CONCURRENCY'])
+
+    return AdaptiveLimiter(
+        RateLimiter(
+            options['RATE_PER_SECOND'],
+            options['BURST'],
+            options['JITTER']
+        ),
+        AdaptiveConcurrency(
+            initial=options['MIN_CONCURRENCY'],
+            minimum=options['MIN_CONCURRENCY'],
+            maximum=maximum,
+            target_latency=options['TARGET_LATENCY']
+        ),
+        options['THROTTLE_PAUSE']
+    )
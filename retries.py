@@ -0,0 +1,232 @@
+"""
+Retrying failed scrapes.
+Failed URLs go back on a deferred queue with exponential backoff
+instead of being dropped, so they are tried again later without
+holding up the workers that are busy with healthy URLs. URLs that
+keep failing are handed to a dead-letter callback.
+"""
+import asyncio
+import collections
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Tuple
+import http_client
+import metrics
+
+
+# Options read from the scrapers' configuration files
+DEFAULT_OPTIONS = {
+    'MAX_RETRIES': 3,
+    'RETRY_BASE_DELAY': 2.0
+}
+
+# Statuses that won't change by asking again
+PERMANENT_STATUSES = (404, 410)
+
+
+class PermanentError(Exception):
+    """A failure that retrying can't fix, such as a removed video."""
+
+
+def is_permanent(error: Exception) -> bool:
+    """Whether asking again can't fix the failure, e.g. a removed video."""
+    if isinstance(error, PermanentError):
+        return True
+
+    return isinstance(error, http_client.HttpError) and \
+        error.status in PERMANENT_STATUSES
+
+
+class RetryPolicy:
+    """Decide whether and when a failed URL is tried again."""
+
+    def __init__(self, max_retries: int, base_delay: float):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """Retry transient errors until the attempts run out."""
+        if is_permanent(error):
+            return False
+
+        return attempt < self.max_retries
+
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given attempt."""
+        return self.base_delay * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+def policy_from_options(options: Dict) -> RetryPolicy:
+    """Build a retry policy from a scraper configuration dict."""
+    options = dict(DEFAULT_OPTIONS, **options)
+
+    return RetryPolicy(options['MAX_RETRIES'], options['RETRY_BASE_DELAY'])
+
+
+class RetryQueue:
+    """
+    Hand out URLs from an iterable, plus failed URLs once their backoff
+    has passed. Every URL handed out must be reported back with either
+    `done` or `fail`; the queue is finished when the iterable is used up
+    and no URL is outstanding.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        policy: RetryPolicy,
+        dead_letter: Callable
+    ):
+        self.urls = iter(urls)
+        self.policy = policy
+        self.dead_letter = dead_letter
+        self.deferred = []
+        self.order = itertools.count()
+        self.outstanding = 0
+        self.exhausted = False
+        self.retried = 0
+
+    def _next(self) -> Tuple:
+        """Return (item, seconds to wait), item being None when idle."""
+        now = time.monotonic()
+        if self.deferred and self.deferred[0][0] <= now:
+            _, _, url, attempt = heapq.heappop(self.deferred)
+            metrics.gauge('retry_queue_depth', len(self.deferred))
+            return (url, attempt), 0
+
+        if not self.exhausted:
+            try:
+                url = next(self.urls)
+            except StopIteration:
+                self.exhausted = True
+            else:
+                # A live UrlFeed gives None while it has nothing new yet
+                if url is not None:
+                    self.outstanding += 1
+                    return (url, 0), 0
+
+        if self.deferred:
+            return None, self.deferred[0][0] - now
+
+        return None, None
+
+    def finished(self) -> bool:
+        """True once every URL has succeeded or been given up on."""
+        return self.exhausted and self.outstanding == 0
+
+    def get(self) -> Tuple:
+        """Block until a (url, attempt) is ready; None when finished."""
+        while True:
+            item, wait = self._next()
+            if item is not None or self.finished():
+                return item
+            time.sleep(wait or 0)
+
+    def done(self) -> None:
+        """Report that a URL handed out has been scraped."""
+        self.outstanding -= 1
+        self._notify()
+
+    def fail(self, url: str, attempt: int, error: Exception) -> None:
+        """Schedule the URL for another attempt or give up on it."""
+        metrics.inc('failures_total', error=type(error).__name__)
+        if self.policy.should_retry(error, attempt):
+            metrics.inc('retries_total')
+            self.retried += 1
+            ready_at = time.monotonic() + self.policy.delay(attempt)
+            heapq.heappush(
+                self.deferred, (ready_at, next(self.order), url, attempt + 1))
+            metrics.gauge('retry_queue_depth', len(self.deferred))
+            self._notify()
+        else:
+            metrics.inc('gave_up_total', error=type(error).__name__)
+            self.dead_letter(url, error, attempt + 1)
+            self.done()
+
+    def _notify(self) -> None:
+        """Hook for waking up waiting consumers."""
+
+
+class AsyncRetryQueue(RetryQueue):
+    """RetryQueue whose consumers wait without blocking the event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = asyncio.Event()
+
+    async def get(self) -> Tuple:
+        """Wait until a (url, attempt) is ready; None when finished."""
+        while True:
+            item, wait = self._next()
+            if item is not None or self.finished():
+                return item
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify(self) -> None:
+        self.changed.set()
+
+
+class UrlFeed:
+    """
+    URLs streamed in by another thread while a scrape is running, e.g.
+    from a channel being harvested. Iterating gives None while nothing
+    new has arrived and stops once the feed is closed and drained.
+    Repeated URLs are only handed out once.
+    """
+
+    def __init__(self, skip: Callable[[str], bool] = None):
+        self.urls = collections.deque()
+        self.seen = set()
+        self.skip = skip
+        self.closed = False
+        self.lock = threading.Lock()
+        self.loop = None
+        self.work = None
+
+    def attach(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        work: 'AsyncRetryQueue'
+    ) -> None:
+        """Wake up the work queue's consumers whenever URLs come in."""
+        self.loop = loop
+        self.work = work
+
+    def _notify(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.work._notify)
+
+    def put(self, urls: Iterable[str]) -> None:
+        """Add URLs to the feed (thread-safe)."""
+        with self.lock:
+            for url in urls:
+                if url in self.seen or (self.skip and self.skip(url)):
+                    continue
+                self.seen.add(url)
+                self.urls.append(url)
+        self._notify()
+
+    def close(self) -> None:
+        """Mark that no more URLs will come in."""
+        with self.lock:
+            self.closed = True
+        self._notify()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        with self.lock:
+            if self.urls:
+                return self.urls.popleft()
+            if self.closed:
+                raise StopIteration
+
+        return None
@@ -0,0 +1,141 @@
+"""Tests of the SQLite aggregate store."""
+import pytest
+import aggregate_store
+
+
+def record(video_id: str, upload_date: str, views: int, scrape_date: str,
+           likes=10, dislikes=1, channel_id='chan') -> dict:
+    return {
+        'video_id': video_id,
+        'channel_id': channel_id,
+        'title': f'Video {video_id}',
+        'upload_date': upload_date,
+        'duration': 600,
+        'views': views,
+        'likes': likes,
+        'dislikes': dislikes,
+        'scrape_date': scrape_date
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    with aggregate_store.AggregateStore(str(tmp_path / 'aggregates.db')) \
+            as store:
+        yield store
+
+
+def totals(store) -> dict:
+    return store.partials().iloc[0].to_dict()
+
+
+def test_sums_and_ranges(store):
+    used = store.add_records([
+        record('a', '2020-01-05', 100, '2021-01-01'),
+        record('b', '2020-03-05', 300, '2021-01-01', dislikes=None),
+        {'video_id': 'c', 'channel_id': 'chan', 'views': None}
+    ])
+
+    assert used == 2
+    row = totals(store)
+    assert row['videos'] == 2
+    assert row['views'] == 400
+    assert row['duration'] == 20
+    assert row['viewtime'] == 4000
+    assert (row['likes'], row['likes_count']) == (20, 2)
+    assert (row['dislikes'], row['dislikes_count']) == (1, 1)
+    assert (row['reactions'], row['reactions_count']) == (11, 1)
+    assert (row['min_views'], row['max_views']) == (100, 300)
+    assert str(row['first_upload'].date()) == '2020-01-05'
+    assert str(row['last_upload'].date()) == '2020-03-05'
+
+
+def test_rescrape_replaces_counts(store):
+    store.add_records([record('a', '2020-01-05', 100, '2021-01-01')])
+    store.add_records([record('a', '2020-01-05', 250, '2021-02-01')])
+    # An older snapshot coming in late is ignored
+    assert store.add_records(
+        [record('a', '2020-01-05', 50, '2020-12-01')]) == 0
+
+    row = totals(store)
+    assert (row['videos'], row['views']) == (1, 250)
+    assert (row['min_views'], row['max_views']) == (250, 250)
+
+
+def test_moved_video_is_retracted_from_its_month(store):
+    store.add_records([
+        record('a', '2020-01-05', 100, '2021-01-01'),
+        record('b', '2020-03-05', 300, '2021-01-01')
+    ])
+    # a's upload date is corrected into March
+    store.add_records([record('a', '2020-03-01', 120, '2021-02-01')])
+
+    months = store.monthly()
+    assert list(months['month']) == ['2020-03']
+    assert months.iloc[0]['videos'] == 2
+    assert str(months.iloc[0]['first_upload'].date()) == '2020-03-01'
+
+    row = totals(store)
+    # The channel's range shrinks back to the remaining videos
+    assert str(row['first_upload'].date()) == '2020-03-01'
+    assert (row['min_views'], row['max_views']) == (120, 300)
+
+
+def test_statistics_match_explore(store):
+    pd = pytest.importorskip('pandas')
+    explore = pytest.importorskip('explore')
+    records = [
+        record('a', '2020-01-05', 100, '2021-01-01'),
+        record('b', '2020-03-05', 300, '2021-01-01', dislikes=None),
+        record('c', '2020-06-15', 700, '2021-01-01', likes=70, dislikes=7),
+        record('d', '2020-02-01', 40, '2021-01-01', channel_id='other')
+    ]
+    store.add_records(records)
+
+    frame = pd.DataFrame(records)
+    frame = explore.get_channel_name(frame, None)
+    frame['channel'] = frame['channel_id']
+    frame = explore.basic_wrangling(frame)
+    frame = explore.meta_function_feature_engineering(frame)
+    expected = explore.calculate_statistics(frame)
+
+    got = explore.finalize_statistics(store.partials())
+    pd.testing.assert_frame_equal(
+        got.rename_axis('channel'), expected, check_dtype=False)
+
+
+def test_older_store_gets_ranges_filled_in(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / 'aggregates.db')
+    sums = ', '.join(f'{name} INTEGER NOT NULL DEFAULT 0'
+                     for name in aggregate_store.SUMS)
+    connection = sqlite3.connect(path)
+    connection.executescript(f"""
+        CREATE TABLE contributions (
+            video_id TEXT PRIMARY KEY, channel_id TEXT NOT NULL,
+            month TEXT NOT NULL, upload_date TEXT NOT NULL,
+            duration INTEGER NOT NULL, views INTEGER NOT NULL,
+            likes INTEGER, dislikes INTEGER, scrape_date TEXT NOT NULL);
+        CREATE TABLE channel_totals (
+            channel_id TEXT PRIMARY KEY, {sums},
+            first_upload TEXT, last_upload TEXT);
+        CREATE TABLE channel_months (
+            channel_id TEXT NOT NULL, month TEXT NOT NULL, {sums},
+            first_upload TEXT, last_upload TEXT,
+            PRIMARY KEY (channel_id, month));
+        INSERT INTO contributions VALUES
+            ('a', 'chan', '2020-01', '2020-01-05', 10, 100, 5, 1, '2021');
+        INSERT INTO channel_totals (channel_id, videos, views,
+            first_upload, last_upload)
+            VALUES ('chan', 1, 100, '2020-01-05', '2020-01-05');
+        INSERT INTO channel_months (channel_id, month, videos, views,
+            first_upload, last_upload)
+            VALUES ('chan', '2020-01', 1, 100, '2020-01-05', '2020-01-05');
+    """)
+    connection.close()
+
+    with aggregate_store.AggregateStore(path) as store:
+        assert (totals(store)['min_views'], totals(store)['max_likes']) == \
+            (100, 5)
+        assert store.monthly().iloc[0]['max_dislikes'] == 1
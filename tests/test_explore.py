@@ -0,0 +1,95 @@
+"""Tests of the chunked statistics of explore.py."""
+import json
+import pandas as pd
+import pytest
+import explore
+
+
+def make_records(count: int, dislikes_every: int = 3) -> list:
+    """Scraped records spread over a few months, some without dislikes."""
+    return [{
+        'video_id': f'v{i:04d}',
+        'channel_id': 'UCtest',
+        'title': f'Video {i}',
+        'upload_date': f'2020-{i % 12 + 1:02d}-{i % 27 + 1:02d}',
+        'duration': 60 * (i % 50 + 1) + 7,
+        'views': 1000 + 37 * i,
+        'likes': str(10 + i),
+        'dislikes': i % 7 if i % dislikes_every else None,
+        'scrape_date': '2021-06-05'
+    } for i in range(count)]
+
+
+@pytest.fixture
+def scrapes(tmp_path, monkeypatch):
+    """A scrape folder with a JSON Lines, a JSON and a dead-letter file."""
+    with open(tmp_path / 'big.jsonl', 'w') as f:
+        for record in make_records(95):
+            f.write(json.dumps(record) + '\n')
+    with open(tmp_path / 'small.json', 'w') as f:
+        json.dump(make_records(12, dislikes_every=2), f)
+    (tmp_path / 'big.failed.jsonl').write_text('{"url": "x"}\n')
+    monkeypatch.setattr(explore, 'SCRAPES_PATH', str(tmp_path) + '/')
+
+    return tmp_path
+
+
+def whole_statistics(names: list) -> tuple:
+    """Statistics and monthly partials from whole scrapes, as before."""
+    frames = explore.wrangle_all(
+        {name: explore.read_scrape(name) for name in names})
+    for frame in frames:
+        explore.meta_function_feature_engineering(frame)
+    data = pd.concat(frames, ignore_index=True)
+    data['month'] = data['upload_date'].dt.to_period('M')
+
+    return (explore.calculate_statistics(data),
+            explore.channel_partials(data, ['channel', 'month']))
+
+
+def test_discover_scrapes_skips_dead_letters(scrapes):
+    assert explore.discover_scrapes() == ['big', 'small']
+
+
+@pytest.mark.parametrize('name, rows', [('big', 95), ('small', 12)])
+def test_read_scrape_chunks(scrapes, name, rows):
+    chunks = list(explore.read_scrape_chunks(name, chunksize=10))
+
+    assert [len(chunk) for chunk in chunks[:-1]] == [10] * (len(chunks) - 1)
+    assert sum(len(chunk) for chunk in chunks) == rows
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True), explore.read_scrape(name))
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 1000])
+def test_chunked_partials_match_whole_scrapes(scrapes, chunksize):
+    expected, expected_months = whole_statistics(['big', 'small'])
+
+    channels, months = explore.chunked_partials(chunksize=chunksize)
+
+    pd.testing.assert_frame_equal(
+        explore.finalize_statistics(channels), expected, check_dtype=False)
+    pd.testing.assert_frame_equal(months, expected_months, check_dtype=False)
+
+
+def test_merge_partials_by_channel_and_month():
+    data = pd.DataFrame({
+        'channel': ['a', 'a', 'a', 'b'],
+        'month': ['2020-01', '2020-01', '2020-02', '2020-01'],
+        'upload_date': pd.to_datetime(
+            ['2020-01-03', '2020-01-20', '2020-02-01', '2020-01-09']),
+        'views': [1, 2, 3, 4],
+        'duration': [1, 1, 1, 1],
+        'viewtime': [1, 2, 3, 4],
+        'likes': pd.array([1, None, 1, 1], dtype='Int64'),
+        'dislikes': pd.array([1, 1, None, 1], dtype='Int64'),
+        'reactions': pd.array([2, None, None, 2], dtype='Int64')
+    })
+    by = ['channel', 'month']
+
+    merged = explore.merge_partials([
+        explore.channel_partials(data.iloc[[0, 3]], by),
+        explore.channel_partials(data.iloc[[1, 2]], by)])
+
+    pd.testing.assert_frame_equal(
+        merged, explore.channel_partials(data, by), check_dtype=False)
@@ -0,0 +1,163 @@
+"""Tests of the SQLite link store."""
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+import link_store
+
+
+def watch(video_id: str) -> str:
+    return f'https://www.youtube.com/watch?v={video_id}'
+
+
+def ago(days: float) -> str:
+    """A timestamp the given days in the past."""
+    return (datetime.now() - timedelta(days=days)).strftime(
+        link_store.TIMESTAMP_FORMAT)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with link_store.LinkStore(str(tmp_path / 'links.db')) as store:
+        yield store
+
+
+def test_add_links_keeps_every_video_once(store):
+    added = store.add_links('chan', [watch('a'), watch('b'), watch('a')])
+    assert added == 2
+    # Links without a video ID and empty lines are skipped
+    assert store.add_links('chan', [watch('b'), 'https://x.y/', '']) == 0
+    assert store.known_ids('chan') == {'a', 'b'}
+    assert store.known_ids('other') == set()
+
+
+def test_pending_and_stale(store):
+    store.add_links('chan', [watch('a'), watch('b'), watch('c')])
+    store.add_links('other', [watch('d')])
+    store.mark_scraped(['a'], when=ago(10))
+    store.mark_scraped(['b'])
+
+    assert store.pending('chan') == [watch('c')]
+    assert store.pending() == [watch('c'), watch('d')]
+    assert store.pending('chan', stale_after_days=5) == [
+        watch('a'), watch('c')]
+    assert store.stale(5) == [watch('a')]
+
+
+def test_channel_stays_complete(store):
+    assert not store.is_complete('chan')
+    store.mark_harvested('chan', complete=False)
+    assert not store.is_complete('chan')
+    store.mark_harvested('chan', complete=True)
+    # An interrupted later harvest doesn't undo a complete one
+    store.mark_harvested('chan', complete=False)
+    assert store.is_complete('chan')
+
+
+def test_import_list_takes_channel_from_file_name(store, tmp_path):
+    path = tmp_path / 'Rarran-202106052026.list'
+    path.write_text(f'{watch("a")}\n\n{watch("b")}\n')
+
+    assert store.import_list(str(path)) == 2
+    assert store.known_ids('Rarran') == {'a', 'b'}
+
+
+def test_older_store_gets_new_columns(tmp_path):
+    path = str(tmp_path / 'links.db')
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE videos (video_id TEXT PRIMARY KEY, '
+        'channel_id TEXT NOT NULL, url TEXT NOT NULL, '
+        'first_seen TEXT NOT NULL, last_scraped TEXT);'
+        "INSERT INTO videos VALUES ('a', 'chan', "
+        "'https://www.youtube.com/watch?v=a', '2021-06-05 20:26:00', NULL);")
+    connection.close()
+
+    with link_store.LinkStore(path) as store:
+        store.record_scrapes([{'video_id': 'a', 'views': 10}])
+        assert store.query('SELECT views, failures FROM videos') == [(10, 0)]
+
+
+def test_refresh_queue_orders_by_priority(store):
+    store.add_links('chan', [watch('quiet'), watch('busy'), watch('new')])
+    # Quiet: no views gained, last scraped 10 days ago
+    store.record_scrapes(
+        [{'video_id': 'quiet', 'views': 0, 'upload_date': '2015-01-01'}],
+        when=ago(30))
+    store.record_scrapes([{'video_id': 'quiet', 'views': 0}], when=ago(10))
+    # Busy: 100 views a day, last scraped 2 days ago
+    store.record_scrapes([{'video_id': 'busy', 'views': 0}], when=ago(20))
+    store.record_scrapes([{'video_id': 'busy', 'views': 1800}], when=ago(2))
+
+    assert store.refresh_queue(3) == [watch('new'), watch('busy'),
+                                      watch('quiet')]
+    assert store.refresh_queue(1) == [watch('new')]
+    assert store.refresh_queue(3, channel_id='other') == []
+
+
+def test_permanent_failures_leave_the_queues(store):
+    store.add_links('chan', [watch('gone'), watch('removed'), watch('ok')])
+    store.record_scrapes([{'video_id': 'removed', 'views': 5}], when=ago(30))
+    store.record_failures([('gone', True), ('removed', True)])
+
+    assert store.pending('chan', stale_after_days=1) == [watch('ok')]
+    assert store.refresh_queue(10) == [watch('ok')]
+
+
+def failed(store, video_id: str, runs: int, days_ago: float) -> None:
+    """Set a video as failed in `runs` runs, the last one `days_ago`."""
+    with store.connection:
+        store.connection.execute(
+            'UPDATE videos SET failures = ?, last_attempted = ? '
+            'WHERE video_id = ?', (runs, ago(days_ago), video_id))
+
+
+def test_record_failures_counts_runs(store):
+    store.add_links('chan', [watch('a')])
+    store.record_failures([('a', False)])
+    store.record_failures([('a', False)])
+
+    assert store.query(
+        'SELECT failures, failed_permanently FROM videos') == [(2, 0)]
+    assert store.pending() == []
+
+
+@pytest.mark.parametrize('runs, days_ago, skipped', [
+    (1, 0.5, True),
+    (1, 1.5, False),
+    (2, 1.5, True),
+    (2, 2.5, False),
+    (3, 3.5, True),
+    (3, 4.5, False)
+])
+def test_failing_videos_back_off(store, runs, days_ago, skipped):
+    store.add_links('chan', [watch('flaky')])
+    failed(store, 'flaky', runs, days_ago)
+
+    expected = [] if skipped else [watch('flaky')]
+    assert store.pending() == expected
+    assert store.refresh_queue(10) == expected
+
+
+def test_scrape_clears_failures(store):
+    store.add_links('chan', [watch('a')])
+    store.record_failures([('a', True)])
+    store.record_scrapes([{'video_id': 'a', 'views': 1}], when=ago(5))
+
+    assert store.query(
+        'SELECT failures, failed_permanently FROM videos') == [(0, 0)]
+    assert store.pending(stale_after_days=1) == [watch('a')]
+
+
+def test_record_hooks_write_failures_back(store):
+    import http_client
+    import video_scraper
+
+    store.add_links('chan', [watch('gone'), watch('flaky')])
+    with video_scraper.record_hooks({}, lambda record: None, store) as (
+            _, on_failure):
+        on_failure(watch('gone'), http_client.HttpError(watch('gone'), 404), 1)
+        on_failure(watch('flaky'), TimeoutError(), 4)
+
+    assert store.query(
+        'SELECT video_id, failures, failed_permanently FROM videos '
+        'ORDER BY video_id') == [('flaky', 1, 0), ('gone', 1, 1)]
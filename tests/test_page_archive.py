@@ -0,0 +1,99 @@
+"""Tests of the raw page archive."""
+import json
+import os
+import random
+import pytest
+import page_archive
+from bench import fixtures
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'archive')
+
+
+def test_append_and_read(directory):
+    with page_archive.PageArchive(directory) as archive:
+        archive.append('a', 'url-a', b'<html>a</html>')
+        archive.append('b', 'url-b', b'<html>b</html>')
+        # Readable before the index is committed
+        assert archive.read('a') == b'<html>a</html>'
+        # Archiving a page again replaces it
+        archive.append('a', 'url-a', b'<html>a, again</html>')
+        assert archive.read('a') == b'<html>a, again</html>'
+        with pytest.raises(KeyError):
+            archive.read('missing')
+
+    with page_archive.PageArchive(directory) as archive:
+        assert archive.read('b') == b'<html>b</html>'
+        assert [entry[0] for entry in archive.entries()] == ['b', 'a']
+
+
+def test_segments_roll_over_and_carry_on(directory):
+    page = os.urandom(4096)
+    with page_archive.PageArchive(directory, segment_mb=0.01) as archive:
+        for i in range(6):
+            archive.append(f'v{i}', f'url-{i}', page)
+    segments = sorted(
+        name for name in os.listdir(directory) if name.startswith('segment'))
+    assert len(segments) > 1
+
+    # A new run appends to the last segment while it has room
+    with page_archive.PageArchive(directory, segment_mb=1) as archive:
+        archive.append('late', 'url-late', b'late')
+        assert archive.entries()[-1][2] == segments[-1]
+        for i in range(6):
+            assert archive.read(f'v{i}') == page
+
+
+def test_zlib_pages_read_back(directory, monkeypatch):
+    monkeypatch.setattr(page_archive, 'zstandard', None)
+    with page_archive.PageArchive(directory) as archive:
+        archive.append('a', 'url-a', b'x' * 1000)
+        assert archive.entries()[0][5] == 'zlib'
+        assert archive.read('a') == b'x' * 1000
+
+
+def test_from_options(directory):
+    assert page_archive.from_options({}) is None
+
+    archive = page_archive.from_options({'ARCHIVE_DIR': directory})
+    try:
+        assert isinstance(archive, page_archive.PageArchive)
+    finally:
+        archive.close()
+
+
+def test_reprocess_parses_archived_pages(directory, tmp_path):
+    import video_scraper
+
+    rng = random.Random(7)
+    videos = [
+        fixtures.make_video(fixtures.make_video_id(rng), 'UCtest', rng)
+        for _ in range(5)
+    ]
+    with page_archive.PageArchive(directory) as archive:
+        for video in videos:
+            archive.append(
+                video['video_id'],
+                f"https://www.youtube.com/watch?v={video['video_id']}",
+                fixtures.make_watch_page(video, page_size=20_000))
+    # A page that can't be parsed is reported, not written
+    with page_archive.PageArchive(directory) as archive:
+        archive.append('broken', 'https://www.youtube.com/watch?v=broken',
+                       b'<html></html>')
+
+    output = str(tmp_path / 'records.jsonl')
+    assert page_archive.reprocess(directory, output, workers=2) == 5
+
+    with open(output) as f:
+        records = {record['video_id']: record for record in map(json.loads, f)}
+    assert sorted(records) == sorted(video['video_id'] for video in videos)
+    for video in videos:
+        record = records[video['video_id']]
+        expected = video_scraper.parse_video_page(
+            f"https://www.youtube.com/watch?v={video['video_id']}",
+            fixtures.make_watch_page(video, page_size=20_000),
+            'fast', record['scrape_date'])
+        assert record == expected
+        assert record['views'] == video['views']
@@ -0,0 +1,105 @@
+"""Tests of the retry policy, the retry queues and the URL feed."""
+import asyncio
+import pytest
+import http_client
+import retries
+
+
+def test_policy_gives_up_on_permanent_errors():
+    policy = retries.RetryPolicy(max_retries=3, base_delay=0)
+
+    assert policy.should_retry(TimeoutError(), 0)
+    assert policy.should_retry(http_client.HttpError('u', 503), 2)
+    assert not policy.should_retry(TimeoutError(), 3)
+    assert not policy.should_retry(http_client.HttpError('u', 404), 0)
+    assert not policy.should_retry(http_client.HttpError('u', 410), 0)
+    assert not policy.should_retry(retries.PermanentError('removed'), 0)
+
+
+def test_backoff_grows_exponentially():
+    policy = retries.RetryPolicy(max_retries=3, base_delay=1)
+
+    for attempt in range(4):
+        delay = policy.delay(attempt)
+        assert 0.5 * 2 ** attempt <= delay <= 1.5 * 2 ** attempt
+
+
+def drain(queue: retries.RetryQueue, failing: dict) -> list:
+    """
+    Work through a queue, failing each URL as many times as `failing`
+    says. Returns the (url, attempt) handed out, in order.
+    """
+    handed_out = []
+    while True:
+        item = queue.get()
+        if item is None:
+            return handed_out
+        handed_out.append(item)
+        url, attempt = item
+        if failing.get(url, 0) > attempt:
+            queue.fail(url, attempt, TimeoutError())
+        else:
+            queue.done()
+
+
+def test_queue_retries_then_dead_letters():
+    dead = []
+    queue = retries.RetryQueue(
+        ['a', 'b', 'c'],
+        retries.RetryPolicy(max_retries=2, base_delay=0),
+        lambda url, error, attempts: dead.append((url, attempts)))
+
+    handed_out = drain(queue, {'a': 1, 'c': 10})
+
+    assert handed_out.count(('a', 1)) == 1
+    assert ('b', 1) not in handed_out
+    assert [item for item in handed_out if item[0] == 'c'] == [
+        ('c', 0), ('c', 1), ('c', 2)]
+    assert dead == [('c', 3)]
+    assert queue.retried == 3
+    assert queue.finished()
+
+
+def test_queue_dead_letters_permanent_errors_at_once():
+    dead = []
+    queue = retries.RetryQueue(
+        ['gone'], retries.RetryPolicy(max_retries=5, base_delay=0),
+        lambda url, error, attempts: dead.append((url, attempts)))
+
+    url, attempt = queue.get()
+    queue.fail(url, attempt, http_client.HttpError(url, 404))
+
+    assert dead == [('gone', 1)]
+    assert queue.get() is None
+
+
+def test_async_queue_waits_for_backoff():
+    async def run() -> list:
+        queue = retries.AsyncRetryQueue(
+            ['a'], retries.RetryPolicy(max_retries=1, base_delay=0.01),
+            lambda *args: None)
+        handed_out = []
+        while True:
+            item = await queue.get()
+            if item is None:
+                return handed_out
+            handed_out.append(item)
+            if item[1] == 0:
+                queue.fail(item[0], item[1], TimeoutError())
+            else:
+                queue.done()
+
+    assert asyncio.run(run()) == [('a', 0), ('a', 1)]
+
+
+def test_url_feed():
+    feed = retries.UrlFeed(skip=lambda url: url == 'skip')
+    assert next(feed) is None
+
+    feed.put(['a', 'b', 'a', 'skip'])
+    feed.put(['b', 'c'])
+    assert [next(feed) for _ in range(4)] == ['a', 'b', 'c', None]
+
+    feed.close()
+    with pytest.raises(StopIteration):
+        next(feed)
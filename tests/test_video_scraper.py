@@ -0,0 +1,72 @@
+"""Tests of the video scraper's fetch/parse pipeline."""
+import functools
+import multiprocessing
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import metrics
+import video_scraper
+from bench import fixtures
+from bench.replay_server import ReplayServer
+
+
+def test_pool_initializer_can_be_pickled():
+    # Spawned and forkserver workers get their initializer pickled
+    assert pickle.loads(pickle.dumps(metrics.reset_registry)) is \
+        metrics.reset_registry
+
+
+def test_parse_in_spawned_worker():
+    rng = random.Random(3)
+    video = fixtures.make_video(fixtures.make_video_id(rng), 'UCtest', rng)
+    url = f"https://www.youtube.com/watch?v={video['video_id']}"
+    page = fixtures.make_watch_page(video, page_size=20_000)
+
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=metrics.reset_registry
+    ) as pool:
+        record, state = pool.submit(
+            video_scraper.parse_video_page_measured,
+            url, page, 'fast', '2021-06-05').result()
+
+    assert record['video_id'] == video['video_id']
+    assert record['views'] == video['views']
+    stages = {dict(labels)['stage'] for name, labels in state['histograms']}
+    assert {'parse', 'extract'} <= stages
+
+
+@pytest.fixture
+def replay(tmp_path):
+    videos = fixtures.generate_corpus(
+        str(tmp_path / 'corpus'), 12, page_size=20_000)
+    server = ReplayServer(str(tmp_path / 'corpus')).start()
+    yield server.base_url, videos
+    server.stop()
+
+
+def test_pipeline_with_spawned_parse_workers(replay, monkeypatch):
+    base_url, videos = replay
+    spawning = functools.partial(
+        ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+    monkeypatch.setattr(video_scraper, 'ProcessPoolExecutor', spawning)
+    options = {
+        'CONCURRENCY': 4,
+        'PARSE_WORKERS': 2,
+        'RATE_PER_SECOND': 1000,
+        'BURST': 1000,
+        'JITTER': 0,
+        'SCRAPE_DATE': '2021-06-05'
+    }
+    urls = [f"{base_url}/watch?v={video['video_id']}" for video in videos]
+    records, failures = [], []
+
+    video_scraper.scrape_list_concurrent(
+        urls, dict(video_scraper.PIPELINE_DEFAULTS, **options),
+        records.append, lambda *failure: failures.append(failure))
+
+    assert failures == []
+    assert sorted(record['video_id'] for record in records) == sorted(
+        video['video_id'] for video in videos)
@@ -6,17 +6,28 @@ from each video and store it as a JSON file for later processing.
 """
 # IMPORTING PYTHON PACKAGES
 # ============================ #
-from urllib.request import urlopen
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
 import json
 import re
 from datetime import datetime
 import time
-import random
 import os
 import sys
 from tqdm import tqdm
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+import aggregate_store
+import http_client
+import link_store
+import metrics
+import page_archive
+import rate_limiter
+import retries
+import writers
+import yt_data
 
 
 # Define the format of the response
@@ -41,6 +52,19 @@ RESPONSE = {
 }
 
 
+# Defaults for the scraping pipeline options
+PIPELINE_DEFAULTS = {
+    'CONCURRENCY': 1,
+    'PARSER': 'fast',
+    'PARSE_WORKERS': os.cpu_count(),
+    'QUEUE_SIZE': 64,
+    'SCRAPE_DATE': None
+}
+
+# Opening and closing div tags, for cutting a block out of a page
+DIV_TAG = re.compile(rb'<(/?)div\b', re.IGNORECASE)
+
+
 # DEFINE HELPER FUNCTIONS
 # ============================ #
 
@@ -68,12 +92,43 @@ def load_configuration_file(optionsPath: str):
         return False
 
 
-def make_soup(url: str) -> BeautifulSoup:
+def video_id_from_url(url: str) -> str:
+    """Get the video ID out of a watch URL."""
+    query = parse_qs(urlparse(url.strip()).query)
+
+    return query.get('v', [None])[0]
+
+
+def fetch_page(url: str) -> bytes:
+    """Read the raw contents at the given URL with the shared client."""
+    return http_client.get_client().get(url)
+
+
+def fetch_page_limited(
+    url: str,
+    limiter: rate_limiter.AdaptiveLimiter
+) -> bytes:
+    """Fetch a page and report its latency and status to the limiter."""
+    start = time.monotonic()
+    status = 200
+    try:
+        with metrics.timer('fetch'):
+            return fetch_page(url)
+    except http_client.HttpError as e:
+        status = e.status
+        raise
+    finally:
+        limiter.record(url, time.monotonic() - start, status)
+
+
+def make_soup(url: str, html: bytes = None) -> BeautifulSoup:
     """
     Read the contents at the given URL and returns a
     Python object based on the structure of the content.
+    Already fetched contents can be passed in through `html`.
     """
-    html = urlopen(url).read()
+    if html is None:
+        html = fetch_page(url)
     return BeautifulSoup(html, 'lxml')
 
 
@@ -87,95 +142,196 @@ def remove_comma(string: str) -> str:
     return ''.join(string.split(','))
 
 
-def scrape_video_data(youtube_video_url: str) -> Dict:
+def new_response() -> Dict:
+    """Return a fresh copy of the response format to fill in."""
+    video = dict(RESPONSE)
+    video['uploader'] = dict(RESPONSE['uploader'])
+    video['statistics'] = dict(RESPONSE['statistics'])
+
+    return video
+
+
+def parse_page_full(html: bytes) -> Tuple:
+    """
+    Build the whole document tree and return the `#watch7-content`
+    element along with the decoded ytInitialData and
+    ytInitialPlayerResponse objects found in its scripts.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    soup_itemprop = soup.find(id='watch7-content')
+
+    initial_data, player_response = None, None
+    for script in soup.find_all('script'):
+        if not script.string:
+            continue
+        if initial_data is None and 'ytInitialData' in script.string:
+            initial_data = yt_data.find_embedded_json(
+                script.string, 'ytInitialData')
+        if player_response is None and \
+                'ytInitialPlayerResponse' in script.string:
+            player_response = yt_data.find_embedded_json(
+                script.string, 'ytInitialPlayerResponse')
+
+    return soup_itemprop, initial_data, player_response
+
+
+def block_end(html: bytes, start: int) -> int:
+    """
+    Index just past the `</div>` closing the `<div` at `start`, counting
+    the divs nested inside it, or -1 when the block isn't closed.
+    """
+    depth = 0
+    for tag in DIV_TAG.finditer(html, start):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            close = html.find(b'>', tag.end())
+            return -1 if close == -1 else close + 1
+
+    return -1
+
+
+def parse_page_fast(html: bytes) -> Tuple:
+    """
+    Cut the `#watch7-content` block out of the raw bytes and only build
+    a tree for it, decoding the embedded objects straight from the bytes.
+    Falls back to the full parser when the block can't be found.
+    """
+    start = html.find(b'id="watch7-content"')
+    start = html.rfind(b'<div', 0, start) if start != -1 else -1
+    end = block_end(html, start) if start != -1 else -1
+
+    if start == -1 or end == -1:
+        return parse_page_full(html)
+
+    soup = BeautifulSoup(html[start:end], 'lxml')
+    soup_itemprop = soup.find(id='watch7-content')
+    initial_data = yt_data.find_embedded_json(html, 'ytInitialData')
+    player_response = yt_data.find_embedded_json(
+        html, 'ytInitialPlayerResponse')
+
+    return soup_itemprop, initial_data, player_response
+
+
+PARSERS = {
+    'full': parse_page_full,
+    'fast': parse_page_fast
+}
+
+
+def extract_itemprops(soup_itemprop, video: Dict) -> None:
+    """Fill in the video from tags having an `itemprop` attribute."""
+    uploader = video['uploader']
+    statistics = video['statistics']
+
+    for tag in soup_itemprop.find_all(itemprop=True, recursive=False):
+        key = tag['itemprop']
+        if key == 'name':
+            # get video's title
+            video['title'] = tag['content']
+        elif key == 'duration':
+            # get video's duration
+            video['duration'] = tag['content']
+        elif key == 'datePublished':
+            # get video's upload date
+            video['upload_date'] = tag['content']
+        elif key == 'genre':
+            # get video's genre (category)
+            video['genre'] = tag['content']
+        elif key == 'paid':
+            # is the video paid?
+            video['is_paid'] = is_true(tag['content'])
+        elif key == 'unlisted':
+            # is the video unlisted?
+            video['is_unlisted'] = is_true(tag['content'])
+        elif key == 'isFamilyFriendly':
+            # is the video family friendly?
+            video['is_family_friendly'] = is_true(tag['content'])
+        elif key == 'thumbnailUrl':
+            # get video thumbnail URL
+            video['thumbnail_url'] = tag['href']
+        elif key == 'interactionCount':
+            # get video's views
+            statistics['views'] = int(tag['content'])
+        elif key == 'channelId':
+            # get uploader's channel ID
+            uploader['channel_id'] = tag['content']
+        elif key == 'description':
+            video['description'] = tag['content']
+        elif key == 'playerType':
+            video['playerType'] = tag['content']
+        elif key == 'regionsAllowed':
+            video['regionsAllowed'].extend(tag['content'].split(','))
+
+
+def extract_statistics(
+    initial_data: Dict,
+    player_response: Dict,
+    video: Dict
+) -> None:
+    """Fill in statistics and extras from the decoded page objects."""
+    details = yt_data.extract_video_details(initial_data, player_response)
+    statistics = video['statistics']
+
+    if not isinstance(statistics['views'], int):
+        statistics['views'] = details['views']
+    statistics['likes'] = details['likes']
+    statistics['dislikes'] = details['dislikes']
+    video['keywords'] = details['keywords']
+    video['chapters'] = details['chapters']
+
+
+def scrape_video_data(
+    youtube_video_url: str,
+    html: bytes = None,
+    parser: str = 'fast'
+) -> Dict:
     """
     Scrape data from YouTube video page and returns a dict.
+    The parser is either 'fast', 'full' or 'compare', the latter
+    running both and reporting any difference in their output.
     """
     # Extract text from URL
-    soup = make_soup(youtube_video_url)
+    if html is None:
+        html = fetch_page(youtube_video_url)
+
+    if parser == 'compare':
+        video = scrape_video_data(youtube_video_url, html, 'full')
+        video_fast = scrape_video_data(youtube_video_url, html, 'fast')
+        if video != video_fast:
+            print(f"*\nParsers disagree on {youtube_video_url}")
+        return video
 
-    soup_itemprop = soup.find(id='watch7-content')
+    with metrics.timer('parse', parser=parser):
+        soup_itemprop, initial_data, player_response = PARSERS[parser](html)
 
-    if len(soup_itemprop.contents) > 1:
-        video = RESPONSE
-        uploader = video['uploader']
-        statistics = video['statistics']
+    # Removed and private videos have no metadata block at all
+    if soup_itemprop is not None and len(soup_itemprop.contents) > 1:
+        video = new_response()
         video['regionsAllowed'] = []
 
-        video['id'] = id
-        # get data from tags having `itemprop` attribute
-        for tag in soup_itemprop.find_all(itemprop=True, recursive=False):
-            key = tag['itemprop']
-            if key == 'name':
-                # get video's title
-                video['title'] = tag['content']
-            elif key == 'duration':
-                # get video's duration
-                video['duration'] = tag['content']
-            elif key == 'datePublished':
-                # get video's upload date
-                video['upload_date'] = tag['content']
-            elif key == 'genre':
-                # get video's genre (category)
-                video['genre'] = tag['content']
-            elif key == 'paid':
-                # is the video paid?
-                video['is_paid'] = is_true(tag['content'])
-            elif key == 'unlisted':
-                # is the video unlisted?
-                video['is_unlisted'] = is_true(tag['content'])
-            elif key == 'isFamilyFriendly':
-                # is the video family friendly?
-                video['is_family_friendly'] = is_true(tag['content'])
-            elif key == 'thumbnailUrl':
-                # get video thumbnail URL
-                video['thumbnail_url'] = tag['href']
-            elif key == 'interactionCount':
-                # get video's views
-                statistics['views'] = int(tag['content'])
-            elif key == 'channelId':
-                # get uploader's channel ID
-                uploader['channel_id'] = tag['content']
-            elif key == 'description':
-                video['description'] = tag['content']
-            elif key == 'playerType':
-                video['playerType'] = tag['content']
-            elif key == 'regionsAllowed':
-                video['regionsAllowed'].extend(tag['content'].split(','))
-
-        all_scripts = soup.find_all('script')
-        for i in range(len(all_scripts)):
-            try:
-                if 'ytInitialData' in all_scripts[i].string:
-                    match = re.findall("label(.*)", re.findall(
-                        "LIKE(.*?)like", all_scripts[i].string)[0])[0]
-                    hasil = (''.join(match.split(',')).split("\"")[-1]).strip()
-                    try:
-                        video['statistics']['likes'] = eval(hasil)
-                    except:
-                        video['statistics']['likes'] = 0
-
-                    match = re.findall("label(.*)", re.findall(
-                        "DISLIKE(.*?)dislike", all_scripts[i].string)[0])[0]
-                    hasil = (''.join(match.split(',')).split("\"")[-1]).strip()
-                    try:
-                        video['statistics']['dislikes'] = eval(hasil)
-                    except:
-                        video['statistics']['dislikes'] = 0
-
-            except:
-                pass
+        video['id'] = video_id_from_url(youtube_video_url)
+        with metrics.timer('extract'):
+            extract_itemprops(soup_itemprop, video)
+            extract_statistics(initial_data, player_response, video)
+        # Most pages hide their dislikes now, so this is only counted
+        statistics = video['statistics']
+        if statistics['likes'] is None or statistics['dislikes'] is None:
+            metrics.inc('missing_reaction_counts_total', parser=parser)
 
         # return RESPONSE
         return video
 
     return ({
-        'error': 'Video with the ID {} does not exist'.format(id)
+        'error': 'Video with the ID {} does not exist'.format(
+            video_id_from_url(youtube_video_url))
     })
 
 
-def extract_metadata(res: Dict) -> Dict:
+def extract_metadata(res: Dict, scrape_date: str = None) -> Dict:
     """Extract specific metadata from a dictionary of values."""
+    if scrape_date is None:
+        scrape_date = datetime.today().strftime('%Y-%m-%d')
+
     title = res['title']
     uploader = res['uploader']['channel_id']
     upload_date = res['upload_date']
@@ -186,45 +342,373 @@ def extract_metadata(res: Dict) -> Dict:
     duration = minutes * 60 + seconds
 
     views = res['statistics']['views']
-    likes = str(res['statistics']['likes']).replace('.', '')
+    likes = res['statistics']['likes']
     dislikes = res['statistics']['dislikes']
 
     out = {
+        'video_id': res['id'],
         'title': title,
         'channel_id': uploader,
         'upload_date': upload_date,
         'duration': duration,
         'views': views,
-        'likes': str(likes),
+        'likes': likes,
         'dislikes': dislikes,
-        'scrape_date': current_date
+        'scrape_date': scrape_date
     }
 
     return out
 
 
-def scrape_list(links_list: List) -> List:
-    """Scrape a list of URL links."""
+def read_links(links_list: str) -> List:
+    """
+    Read a list of URL links from a file, one per line, or the URLs
+    recorded in a dead-letter file (.jsonl) by an earlier run.
+    """
+    if links_list.endswith('.jsonl'):
+        return writers.read_dead_letters(links_list)
+
+    with open(links_list) as f:
+        channel_videos = [line.strip() for line in f if line.strip()]
+
+    return channel_videos
+
+
+def parse_video_page(
+    url: str,
+    html: bytes,
+    parser: str,
+    scrape_date: str
+) -> Dict:
+    """Turn a fetched page into its metadata (runs in a worker process)."""
+    response = scrape_video_data(url, html, parser)
+    if 'error' in response:
+        raise retries.PermanentError(response['error'])
+
+    return extract_metadata(response, scrape_date)
+
+
+def parse_video_page_measured(*args) -> Tuple[Dict, Dict]:
+    """
+    parse_video_page for the worker processes, which also send back
+    the metrics they recorded.
+    """
+    try:
+        return parse_video_page(*args), metrics.registry.drain()
+    except Exception:
+        metrics.inc('parse_failures_total')
+        raise
+
+
+def archive_page(
+    archive: page_archive.PageArchive,
+    url: str,
+    html: bytes
+) -> None:
+    """Keep a fetched page in the archive, if there is one."""
+    if archive is not None:
+        archive.append(video_id_from_url(url), url, html)
+
+
+async def fetch_stage(
+    work: retries.AsyncRetryQueue,
+    queue: asyncio.Queue,
+    limiter: rate_limiter.AdaptiveLimiter,
+    archive: page_archive.PageArchive = None
+) -> None:
+    """
+    Fetch worker: take URLs (new ones or retries that are due) off the
+    work queue and put the raw pages on the page queue. Waits for the
+    limiter before every request and whenever the page queue is full.
+    Fetched pages are also kept in the archive, if given.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await work.get()
+        if item is None:
+            break
+        url, attempt = item
+        async with limiter.request(url):
+            try:
+                html = await loop.run_in_executor(
+                    None, fetch_page_limited, url, limiter)
+            except Exception as e:
+                work.fail(url, attempt, e)
+                continue
+        if archive is not None:
+            await loop.run_in_executor(
+                None, archive_page, archive, url, html)
+        await queue.put((url, attempt, html))
+        metrics.gauge('page_queue_depth', queue.qsize())
+
+
+async def parse_stage(
+    work: retries.AsyncRetryQueue,
+    queue: asyncio.Queue,
+    pool: ProcessPoolExecutor,
+    options: Dict,
+    on_record: Callable
+) -> None:
+    """
+    Hand raw pages from the queue to the process pool, keeping only a
+    couple of pages per worker in flight so the queue fills up and
+    holds the fetchers back when parsing falls behind.
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(2 * options['PARSE_WORKERS'])
+    in_flight = set()
+
+    def collect(future: asyncio.Future, url: str, attempt: int) -> None:
+        in_flight.discard(future)
+        slots.release()
+        if future.exception() is None:
+            record, worker_metrics = future.result()
+            metrics.registry.merge(worker_metrics)
+            on_record(record)
+            work.done()
+        else:
+            work.fail(url, attempt, future.exception())
+
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        url, attempt, html = item
+        metrics.gauge('page_queue_depth', queue.qsize())
+        await slots.acquire()
+        future = loop.run_in_executor(
+            pool, parse_video_page_measured,
+            url, html, options['PARSER'], options['SCRAPE_DATE'])
+        future.add_done_callback(
+            lambda f, url=url, attempt=attempt: collect(f, url, attempt))
+        in_flight.add(future)
+
+    if in_flight:
+        await asyncio.wait(set(in_flight))
+
+
+async def run_pipeline(
+    urls: Iterable[str],
+    options: Dict,
+    on_record: Callable,
+    on_failure: Callable,
+    archive: page_archive.PageArchive = None
+) -> None:
+    """
+    Scrape URLs with a fetch stage (up to CONCURRENCY asyncio workers
+    doing I/O, paced by the adaptive rate limiter) and a parse stage
+    (PARSE_WORKERS processes), connected by a queue holding at most
+    QUEUE_SIZE raw pages. Failed URLs are retried with backoff and
+    passed to `on_failure` once they run out of attempts.
+    """
+    options = dict(PIPELINE_DEFAULTS, **options)
+    limiter = rate_limiter.from_options(options)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=options['CONCURRENCY']))
+    queue = asyncio.Queue(maxsize=options['QUEUE_SIZE'])
+    work = retries.AsyncRetryQueue(
+        urls, retries.policy_from_options(options), on_failure)
+    if isinstance(urls, retries.UrlFeed):
+        urls.attach(loop, work)
+
+    with ProcessPoolExecutor(
+        max_workers=options['PARSE_WORKERS'],
+        initializer=metrics.reset_registry
+    ) as pool:
+        async def fetch_all() -> None:
+            await asyncio.gather(*[
+                fetch_stage(work, queue, limiter, archive)
+                for _ in range(options['CONCURRENCY'])
+            ])
+            await queue.put(None)
+
+        # Awaited together, so that a failing parse stage (e.g. a broken
+        # pool) ends the run instead of leaving the fetchers blocked on
+        # a full page queue
+        await asyncio.gather(
+            parse_stage(work, queue, pool, options, on_record), fetch_all())
+
+    print(f"Retried {work.retried:,} failed requests.")
+
+
+def scrape_list_concurrent(
+    channel_videos: List,
+    options: Dict,
+    on_record: Callable,
+    on_failure: Callable,
+    archive: page_archive.PageArchive = None
+) -> None:
+    """Scrape URL links through the concurrent fetch/parse pipeline."""
+    progress = tqdm(total=len(channel_videos))
+
+    def collect(metadata: Dict) -> None:
+        on_record(metadata)
+        progress.update()
+
+    asyncio.run(run_pipeline(
+        channel_videos, options, collect, on_failure, archive))
+    progress.close()
+
+
+def scrape_list_sequential(
+    channel_videos: List,
+    options: Dict,
+    on_record: Callable,
+    on_failure: Callable,
+    archive: page_archive.PageArchive = None
+) -> None:
+    """Scrape URL links one at a time, paced by the rate limiter."""
+    limiter = rate_limiter.from_options(options)
+    work = retries.RetryQueue(
+        channel_videos, retries.policy_from_options(options), on_failure)
+
+    progress = tqdm(total=len(channel_videos))
+    while True:
+        item = work.get()
+        if item is None:
+            break
+        url, attempt = item
+        try:
+            limiter.wait(url)
+            html = fetch_page_limited(url, limiter)
+            archive_page(archive, url, html)
+            metadata = parse_video_page(
+                url, html, options['PARSER'], options['SCRAPE_DATE'])
+        except Exception as e:
+            work.fail(url, attempt, e)
+            continue
+        on_record(metadata)
+        work.done()
+        progress.update()
+    progress.close()
+
+
+@contextmanager
+def record_hooks(
+    options: Dict,
+    on_record: Callable,
+    store: link_store.LinkStore = None
+) -> Iterator[Tuple[Callable, Callable]]:
+    """
+    Build the (on_record, on_failure) callbacks of a scrape. Records
+    are also written back to the link store, if given, in batches of
+    FLUSH_EVERY, marking their video as scraped along with its views,
+    and folded into the aggregate store at AGGREGATE_STORE_PATH, if set.
+    URLs that keep failing are written to DEAD_LETTER_PATH, if set, and
+    recorded in the link store so later runs skip or back off from them.
+    """
+    scraped, failed = [], []
+    aggregates = None
+    if options.get('AGGREGATE_STORE_PATH'):
+        aggregates = aggregate_store.AggregateStore(
+            options['AGGREGATE_STORE_PATH'])
+
+    def flush() -> None:
+        if store is not None:
+            store.record_scrapes(scraped)
+            store.record_failures(failed)
+        if aggregates is not None:
+            aggregates.add_records(scraped)
+        scraped.clear()
+        failed.clear()
+
+    def on_scraped(record: Dict) -> None:
+        with metrics.timer('write'):
+            on_record(record)
+        metrics.inc('records_total')
+        if store is not None or aggregates is not None:
+            scraped.append(record)
+            if len(scraped) >= options.get('FLUSH_EVERY', 10):
+                flush()
+
+    dead_letters = None
+    if options.get('DEAD_LETTER_PATH'):
+        dead_letters = writers.DeadLetterWriter(options['DEAD_LETTER_PATH'])
+
+    def on_failure(url: str, error: Exception, attempts: int) -> None:
+        print(f"*\nGave up on {url} after {attempts} attempts: "
+              f"{type(error).__name__}")
+        if dead_letters is not None:
+            dead_letters.write_failure(url, error, attempts)
+        video_id = video_id_from_url(url)
+        if store is not None and video_id is not None:
+            failed.append((video_id, retries.is_permanent(error)))
+
+    try:
+        yield on_scraped, on_failure
+    finally:
+        if dead_letters is not None:
+            dead_letters.close()
+        flush()
+        if aggregates is not None:
+            aggregates.close()
+
+
+def scrape_list(
+    links_list: str,
+    options: Dict = None,
+    on_record: Callable = None,
+    skip_ids: Set[str] = None
+) -> List:
+    """
+    Scrape a list of URL links. With a CONCURRENCY above 1 the pages
+    go through the fetch/parse pipeline, otherwise one by one.
+    Records are returned as a list, unless an `on_record` callback is
+    given to receive them one at a time. Videos in `skip_ids` are skipped.
+    URLs that keep failing are written to DEAD_LETTER_PATH, if set, and
+    with an ARCHIVE_DIR every fetched page is archived there.
+    With a LINK_STORE_PATH, scraped videos are marked in that store and
+    when no list is given its pending videos are scraped instead, or
+    with a REFRESH_BUDGET, that many of the videos most due a refresh.
+    """
+    options = dict(PIPELINE_DEFAULTS, **(options or {}))
+
     # Print current datetime
     print(datetime.now().strftime(" %H:%M:%S"))
 
     # Keep track of runtime
     t1 = time.time()
-    with open(links_list) as f:
-        channel_videos = f.readlines()
+    store = None
+    if options.get('LINK_STORE_PATH'):
+        store = link_store.LinkStore(options['LINK_STORE_PATH'])
+    if links_list:
+        channel_videos = read_links(links_list)
+    elif store is not None and options.get('REFRESH_BUDGET'):
+        channel_videos = store.refresh_queue(options['REFRESH_BUDGET'])
+        print(f"Refreshing the {len(channel_videos):,} videos most due.")
+    elif store is not None:
+        channel_videos = store.pending(
+            stale_after_days=options.get('STALE_AFTER_DAYS'))
+        print(f"{len(channel_videos):,} videos pending in the link store.")
+    else:
+        raise ValueError("Either a links list or LINK_STORE_PATH is needed")
+    if skip_ids:
+        channel_videos = [
+            url for url in channel_videos
+            if video_id_from_url(url) not in skip_ids
+        ]
+        print(f"Skipping {len(skip_ids):,} already scraped videos.")
 
     scraped_videos_list = []
-    for i in tqdm(range(0, len(channel_videos))):
-        try:
-            response = scrape_video_data(channel_videos[i])
-            metadata = extract_metadata(response)
-            scraped_videos_list.append(metadata)
-            if i % 10 == 0:
-                print(i)
-                print(datetime.now().strftime(" %H:%M:%S"))
-        except:
-            pass
-        time.sleep(random_generator)
+    if on_record is None:
+        on_record = scraped_videos_list.append
+
+    archive = page_archive.from_options(options)
+    try:
+        with record_hooks(options, on_record, store) as (
+                on_record, on_failure):
+            if options['CONCURRENCY'] > 1:
+                scrape_list_concurrent(
+                    channel_videos, options, on_record, on_failure, archive)
+            else:
+                scrape_list_sequential(
+                    channel_videos, options, on_record, on_failure, archive)
+    finally:
+        if store is not None:
+            store.close()
+        if archive is not None:
+            archive.close()
 
     # Keep track of runtime
     print(f"URL list scraped in: {round(time.time()-t1,2):,}s")
@@ -235,10 +719,7 @@ def scrape_list(links_list: List) -> List:
 # THE MAIN METHOD
 # ============================ #
 if __name__ == "__main__":
-    runtime_start = time()
-
-    # Random generate times for sleep intervals
-    random_generator = random.randint(0, 3)
+    runtime_start = time.time()
 
     # Keep track of current position in time
     current_date_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
@@ -247,7 +728,7 @@ if __name__ == "__main__":
 
     # Unpack the configuration options
     # -------------------------------------- #
-    config_path = "config/scraper_config.json"
+    config_path = "config/video_scraper_config.json"
     config_options = load_configuration_file(config_path)
 
     if config_options is False:
@@ -260,19 +741,40 @@ if __name__ == "__main__":
         for option in config_options.keys():
             print(f"\t* {option}: {config_options[option]}")
         print()
-        links_list = config_options["INPUT_PATH"]
+        links_list = config_options.get("INPUT_PATH")
         output_path = config_options["OUTPUT_PATH"]
+        config_options["SCRAPE_DATE"] = current_date
+        http_client.configure(config_options)
 
     # Scrape list of videos on the channel
     # -------------------------------------- #
-    scraped_videos_list = scrape_list(links_list)
+    exporter = metrics.from_options(config_options)
+    if config_options.get("OUTPUT_FORMAT", "json") == "jsonl":
+        # Stream each record to disk as soon as it is parsed
+        resume = config_options.get("RESUME", False)
+        skip_ids = writers.done_video_ids(output_path) if resume else None
+        with writers.JsonlWriter(
+            output_path,
+            append=resume,
+            flush_every=config_options.get("FLUSH_EVERY", 10)
+        ) as writer:
+            scrape_list(
+                links_list, config_options,
+                on_record=writer.write, skip_ids=skip_ids)
+    elif config_options.get("OUTPUT_FORMAT") == "parquet":
+        # Typed columns, for loading straight into explore.py
+        with writers.ParquetWriter(output_path) as writer:
+            scrape_list(links_list, config_options, on_record=writer.write)
+    else:
+        scraped_videos_list = scrape_list(links_list, config_options)
 
-    # Save the results in a JSON file
-    # -------------------------------------- #
-    with open(output_path, 'w') as f:
-        json.dump(scraped_videos_list, f)
+        # Save the results in a JSON file
+        # -------------------------------------- #
+        with open(output_path, 'w') as f:
+            json.dump(scraped_videos_list, f)
+    exporter.close()
 
     # Keeping track of runtime.
     # -------------------------------------- #
-    runtime_end = time()
+    runtime_end = time.time()
     print(f"\nScript done in {round(runtime_end-runtime_start,2):,}s")
@@ -0,0 +1,212 @@
+"""
+Writers for scraped records.
+Records are streamed to disk as soon as they are parsed, so a crash
+late in a run only loses the last few records and memory doesn't
+grow with the size of the channel.
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Set
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Columns of the Parquet output, in order, with their Arrow types
+PARQUET_COLUMNS = (
+    ('video_id', 'string'),
+    ('title', 'string'),
+    ('channel_id', 'dictionary'),
+    ('upload_date', 'date32'),
+    ('duration', 'int64'),
+    ('views', 'int64'),
+    ('likes', 'int64'),
+    ('dislikes', 'int64'),
+    ('scrape_date', 'date32')
+)
+
+
+class JsonlWriter:
+    """Append records to a JSON Lines file, one record per line."""
+
+    def __init__(self, path: str, append: bool = False, flush_every: int = 10):
+        if append:
+            drop_partial_line(path)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self.flush_every = flush_every
+        self.pending = 0
+
+    def write(self, record: Dict) -> None:
+        """Write one record, flushing every `flush_every` records."""
+        self.file.write(json.dumps(record) + '\n')
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Push buffered records all the way to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class DeadLetterWriter(JsonlWriter):
+    """Record URLs that failed for good, with the class of the error."""
+
+    def __init__(self, path: str):
+        super().__init__(path, append=True, flush_every=1)
+
+    def write_failure(self, url: str, error: Exception, attempts: int) -> None:
+        """Append one failed URL."""
+        self.write({
+            'url': url,
+            'error_class': type(error).__name__,
+            'error': str(error),
+            'attempts': attempts,
+            'failed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+
+def parquet_schema() -> 'pyarrow.Schema':
+    """The fixed schema of the Parquet output."""
+    types = {
+        'string': pyarrow.string(),
+        'dictionary': pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+        'date32': pyarrow.date32(),
+        'int64': pyarrow.int64()
+    }
+
+    return pyarrow.schema(
+        [(name, types[kind]) for name, kind in PARQUET_COLUMNS])
+
+
+def to_date(value: str) -> date:
+    """Turn a scraped 'YYYY-MM-DD...' string into a date."""
+    if value is None:
+        return None
+
+    return date.fromisoformat(value[:10])
+
+
+class ParquetWriter:
+    """
+    Write records to a Parquet file with a fixed schema: int64 counts,
+    date32 dates and dictionary-encoded channel IDs. Records are
+    written out as a row group every `row_group_size` records; the file
+    is only readable once closed.
+    """
+
+    def __init__(self, path: str, row_group_size: int = 10000):
+        if pyarrow is None:
+            raise RuntimeError(
+                "Writing Parquet needs the pyarrow package installed")
+        self.schema = parquet_schema()
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def write(self, record: Dict) -> None:
+        """Buffer one record, writing a row group once enough are in."""
+        self.rows.append(record)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered records as one row group."""
+        if not self.rows:
+            return
+
+        arrays = []
+        for name, kind in PARQUET_COLUMNS:
+            values = [row.get(name) for row in self.rows]
+            if kind == 'dictionary':
+                arrays.append(pyarrow.array(
+                    values, pyarrow.string()).dictionary_encode())
+            elif kind == 'date32':
+                arrays.append(pyarrow.array(
+                    [to_date(value) for value in values], pyarrow.date32()))
+            else:
+                arrays.append(pyarrow.array(
+                    values, self.schema.field(name).type))
+        self.writer.write_table(
+            pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        self.rows = []
+
+    def close(self) -> None:
+        """Write the last row group and the file footer."""
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def drop_partial_line(path: str) -> None:
+    """Cut off a last line left unfinished by an interrupted run."""
+    if not os.path.isfile(path):
+        return
+
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            chunk_start = max(0, position - 65536)
+            f.seek(chunk_start)
+            chunk = f.read(position - chunk_start)
+            if position == end and chunk.endswith(b'\n'):
+                return
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                f.truncate(chunk_start + newline + 1)
+                return
+            position = chunk_start
+        f.truncate(0)
+
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    """Read records from a JSON Lines file, skipping unreadable lines."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def done_video_ids(path: str) -> Set[str]:
+    """Collect the video IDs already present in a JSON Lines output."""
+    if not os.path.isfile(path):
+        return set()
+
+    return {
+        record['video_id'] for record in read_jsonl(path)
+        if record.get('video_id')
+    }
+
+
+def read_dead_letters(path: str) -> List[str]:
+    """Read the URLs out of a dead-letter file, without duplicates."""
+    urls = [record['url'] for record in read_jsonl(path) if 'url' in record]
+
+    return list(dict.fromkeys(urls))
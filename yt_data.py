@@ -0,0 +1,164 @@
+"""
+Decode the JSON objects YouTube embeds in its pages
+(`ytInitialData`, `ytInitialPlayerResponse`) and read values out of
+them by path lookup instead of scanning the page text with regexes.
+"""
+import json
+import re
+from typing import Any, Dict, List, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Ends of the assignment statements the objects are embedded with
+JSON_TERMINATORS = (b';</script>', b';var ', b';\n')
+
+_decoder = json.JSONDecoder()
+
+
+# DECODING
+# ============================ #
+
+def find_embedded_json(page: Union[bytes, str], name: str) -> Dict:
+    """
+    Cut the object assigned to `name` out of a page (or script) and
+    decode it. Returns None when the page doesn't embed the object.
+    """
+    if isinstance(page, str):
+        page = page.encode('utf-8')
+
+    marker = page.find(name.encode('utf-8') + b' = {')
+    if marker == -1:
+        marker = page.find(b'["' + name.encode('utf-8') + b'"] = {')
+    if marker == -1:
+        return None
+    start = page.find(b'{', marker)
+
+    # The fast decoder needs the exact slice, so try the usual endings
+    # of the statement first and only scan with the stdlib if those fail.
+    if orjson is not None:
+        for terminator in JSON_TERMINATORS:
+            end = page.find(terminator, start)
+            if end == -1:
+                continue
+            try:
+                return orjson.loads(page[start:end])
+            except orjson.JSONDecodeError:
+                continue
+
+    text = page[start:].decode('utf-8', 'replace')
+    try:
+        obj, _ = _decoder.raw_decode(text)
+    except json.JSONDecodeError:
+        return None
+
+    return obj
+
+
+def get_path(obj: Any, path: Tuple, default: Any = None) -> Any:
+    """Follow a path of keys and list indices into a decoded object."""
+    for key in path:
+        try:
+            obj = obj[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+
+    return obj
+
+
+def parse_count(text: str) -> int:
+    """Turn a label such as '1,129 likes' or 'No likes' into an int."""
+    if text is None:
+        return None
+
+    digits = re.sub(r'[^\d]', '', text)
+    if digits:
+        return int(digits)
+    if text.lower().startswith('no '):
+        return 0
+
+    return None
+
+
+# VIDEO PAGES
+# ============================ #
+
+VIDEO_ACTIONS_PATH = (
+    'contents', 'twoColumnWatchNextResults', 'results', 'results',
+    'contents', 0, 'videoPrimaryInfoRenderer', 'videoActions',
+    'menuRenderer', 'topLevelButtons'
+)
+
+CHAPTERS_PATH = (
+    'playerOverlays', 'playerOverlayRenderer', 'decoratedPlayerBarRenderer',
+    'decoratedPlayerBarRenderer', 'playerBar',
+    'multiMarkersPlayerBarRenderer', 'markersMap'
+)
+
+
+def _toggle_buttons(initial_data: Dict) -> List:
+    """List the toggle buttons under the video's primary info."""
+    buttons = []
+    for button in get_path(initial_data, VIDEO_ACTIONS_PATH, []):
+        if 'toggleButtonRenderer' in button:
+            buttons.append(button['toggleButtonRenderer'])
+        segmented = button.get('segmentedLikeDislikeButtonRenderer', {})
+        for key in ('likeButton', 'dislikeButton'):
+            renderer = get_path(segmented, (key, 'toggleButtonRenderer'))
+            if renderer is not None:
+                buttons.append(renderer)
+
+    return buttons
+
+
+def extract_reactions(initial_data: Dict) -> Tuple:
+    """Read the like and dislike counts from ytInitialData."""
+    counts = {}
+    for button in _toggle_buttons(initial_data):
+        icon = get_path(button, ('defaultIcon', 'iconType'))
+        if icon not in ('LIKE', 'DISLIKE') or icon in counts:
+            continue
+        label = get_path(
+            button,
+            ('defaultText', 'accessibility', 'accessibilityData', 'label'))
+        if label is None:
+            label = get_path(button, ('defaultText', 'simpleText'))
+        counts[icon] = parse_count(label)
+
+    return counts.get('LIKE'), counts.get('DISLIKE')
+
+
+def extract_chapters(initial_data: Dict) -> List:
+    """Read the chapter titles and start times (in seconds)."""
+    chapters = []
+    for marker in get_path(initial_data, CHAPTERS_PATH, []):
+        for chapter in get_path(marker, ('value', 'chapters'), []):
+            renderer = chapter.get('chapterRenderer', {})
+            start_ms = renderer.get('timeRangeStartMillis', 0)
+            chapters.append({
+                'title': get_path(renderer, ('title', 'simpleText')),
+                'start': start_ms // 1000
+            })
+
+    return chapters
+
+
+def extract_video_details(
+    initial_data: Dict,
+    player_response: Dict
+) -> Dict:
+    """Collect the statistics and extras found in the decoded objects."""
+    likes, dislikes = extract_reactions(initial_data)
+    views = get_path(player_response, ('videoDetails', 'viewCount'))
+
+    return {
+        'views': int(views) if views is not None else None,
+        'likes': likes,
+        'dislikes': dislikes,
+        'keywords': get_path(
+            player_response, ('videoDetails', 'keywords'), []),
+        'chapters': extract_chapters(initial_data)
+    }